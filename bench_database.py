@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the database.py storage paths
+Builds synthetic data files in a temp directory, nothing in the working directory is touched
+
+usage: python bench_database.py [rows]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+import database
+
+DEFAULT_ROWS = 350000  # ~10 years of 15 minute readings
+
+
+def write_synthetic_csv(path, rows, start=datetime(2016, 1, 1)):
+    """Write `rows` readings 15 minutes apart in the weather_data.csv format"""
+    with open(path, 'w') as f:
+        f.write(database.DATA_HEADER)
+        for i in range(rows):
+            timestamp = (start + timedelta(minutes=15 * i)).strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"{timestamp},{20 + (i % 100) / 10},{25 + (i % 50) / 10},{60 + (i % 30) / 10},{1013 + (i % 20) / 10}\n")
+
+
+def legacy_remove_oldest_line(file_path):
+    """The pre-compaction remove_oldest_line: read the whole file, drop one line, write it all back"""
+    with open(file_path, 'r') as f:
+        lines = f.readlines()
+    if len(lines) > 1:
+        del lines[1]
+        with open(file_path, 'w') as f:
+            f.writelines(lines)
+
+
+def bench_compaction(workdir, rows):
+    """Trim one year off a `rows` row file: legacy per-line rewrite vs single-pass compaction"""
+    print(f"\nCompaction: trimming 1 year from a {rows} row file")
+    path = os.path.join(workdir, "weather_data.csv")
+    write_synthetic_csv(path, rows)
+    size_mb = os.path.getsize(path) / 1e6
+    expired = min(365 * 96, rows // 2)
+
+    # the legacy path costs one full rewrite per expired line, time a sample and extrapolate
+    sample = 20
+    start = time.perf_counter()
+    for i in range(sample):
+        legacy_remove_oldest_line(path)
+    per_line = (time.perf_counter() - start) / sample
+    legacy_total = per_line * expired
+
+    write_synthetic_csv(path, rows)
+    with open(path, 'r') as f:
+        f.readline()
+        cutoff_str = None
+        for i, line in enumerate(f):
+            if i == expired:
+                cutoff_str = line[:19]
+                break
+
+    start = time.perf_counter()
+    removed = database.compact_file(path, cutoff_str=cutoff_str)
+    compact_total = time.perf_counter() - start
+
+    print(f"  file size:              {size_mb:.1f} MB")
+    print(f"  rows to remove:         {expired} (removed {removed})")
+    print(f"  legacy, per line:       {per_line * 1000:.1f} ms")
+    print(f"  legacy, extrapolated:   {legacy_total:.1f} s")
+    print(f"  single-pass compaction: {compact_total * 1000:.1f} ms")
+    print(f"  speedup:                {legacy_total / compact_total:.0f}x")
+
+
+def bench_timestamp_parsing(workdir, rows):
+    """Per-row timestamp cost: strptime vs the sliced epoch parser vs raw string comparison"""
+    print(f"\nTimestamp parsing: {rows} rows")
+    start_date = datetime(2016, 1, 1)
+    timestamps = [(start_date + timedelta(minutes=15 * i)).strftime("%Y-%m-%d %H:%M:%S") for i in range(rows)]
+    cutoff = start_date + timedelta(minutes=15 * (rows - 96))
+    cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+    start = time.perf_counter()
+    matched = sum(1 for t in timestamps if datetime.strptime(t, "%Y-%m-%d %H:%M:%S") >= cutoff)
+    strptime_total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cutoff_epoch = database.timestamp_to_epoch(cutoff_str)
+    assert matched == sum(1 for t in timestamps if database.timestamp_to_epoch(t) >= cutoff_epoch)
+    epoch_total = time.perf_counter() - start
+
+    start = time.perf_counter()
+    assert matched == sum(1 for t in timestamps if database.is_timestamp(t) and t >= cutoff_str)
+    string_total = time.perf_counter() - start
+
+    print(f"  strptime + datetime compare:  {strptime_total * 1000:.0f} ms ({strptime_total / rows * 1e6:.2f} us/row)")
+    print(f"  sliced epoch parse + compare: {epoch_total * 1000:.0f} ms ({epoch_total / rows * 1e6:.2f} us/row)")
+    print(f"  shape check + string compare: {string_total * 1000:.0f} ms ({string_total / rows * 1e6:.2f} us/row)")
+
+    # the csv row reader with no index offset, so every row is filtered
+    path = os.path.join(workdir, "weather_data.csv")
+    write_synthetic_csv(path, rows)
+    start = time.perf_counter()
+    data = list(database._iter_csv_rows(path, start_str=cutoff_str))
+    scan_total = time.perf_counter() - start
+    print(f"  full-file range scan:         {scan_total * 1000:.0f} ms for {len(data)} matching rows")
+
+
+def bench_record_memory(workdir, rows):
+    """Memory held per row: dict of strings vs WeatherRecord"""
+    rows = min(rows, 365 * 96)
+    print(f"\nRecord memory: {rows} rows held in a list")
+    path = os.path.join(workdir, "weather_data.csv")
+    write_synthetic_csv(path, rows)
+
+    results = {}
+    for label, as_records in (("dict of strings", False), ("WeatherRecord", True)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        data = list(database._iter_csv_rows(path, as_records=as_records))
+        elapsed = time.perf_counter() - start
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[label] = held / len(data)
+        print(f"  {label + ':':17} {held / len(data):.0f} bytes/row, {held / 1e6:.1f} MB total, read in {elapsed * 1000:.0f} ms")
+        del data
+
+    print(f"  reduction:        {results['dict of strings'] / results['WeatherRecord']:.1f}x")
+
+
+def bench_array_loader(workdir, rows):
+    """Full-history load: read_data_range(as_records=True) vs load_range_arrays (needs numpy)"""
+    print(f"\nColumnar loader: {rows} rows")
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("  skipped, numpy not installed")
+        return
+
+    path = os.path.join(workdir, database.WEATHER_DATA_FILE)
+    write_synthetic_csv(path, rows)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        records = database.read_data_range(as_records=True)
+        records_total = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columns = database.load_range_arrays()
+        arrays_total = time.perf_counter() - start
+
+        start = time.perf_counter()
+        daily_max = columns['exterior_temp'][: len(columns['exterior_temp']) // 96 * 96].reshape(-1, 96).max(axis=1)
+        reduce_total = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+
+    print(f"  per-row WeatherRecords: {records_total * 1000:.0f} ms for {len(records)} rows")
+    print(f"  load_range_arrays:      {arrays_total * 1000:.0f} ms for {len(columns['timestamp'])} rows")
+    print(f"  daily max over arrays:  {reduce_total * 1000:.1f} ms for {len(daily_max)} days")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ROWS
+
+    print("=" * 50)
+    print("Database Benchmarks")
+    print(f"Rows: {rows}")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        bench_compaction(workdir, rows)
+        bench_timestamp_parsing(workdir, rows)
+        bench_record_memory(workdir, rows)
+        bench_array_loader(workdir, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark for the main.py entry point
+Each run is a fresh interpreter, like a Witty Pi boot or a regular_loop.sh cycle:
+  - `python -X importtime -c "import main"` import cost, largest modules first
+  - interpreter start to first sensor sample (initialize_sensors + read_all_sensors)
+
+usage: python bench_startup.py [runs] [--max-ms N]   (exits 1 if the median script start to first sample is slower than N ms)
+"""
+
+import os
+import re
+import sys
+import time
+import statistics
+import subprocess
+
+DEFAULT_RUNS = 5
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_SAMPLE_SCRIPT = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from sensors import initialize_sensors, read_all_sensors
+sensors = initialize_sensors()
+read_all_sensors(sensors)
+print(f"FIRST_SAMPLE {(imported - start) * 1000:.1f} {(time.perf_counter() - start) * 1000:.1f}")
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_profile():
+    """cumulative import time per module of `import main`, in microseconds"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    return modules
+
+
+def first_sample_run():
+    """one fresh interpreter: (wall ms from spawn to exit, ms in import main, ms from interpreter code start to first sample)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", FIRST_SAMPLE_SCRIPT], cwd=REPO_DIR, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    for line in result.stdout.splitlines():
+        if line.startswith("FIRST_SAMPLE"):
+            _, import_ms, sample_ms = line.split()
+            return wall, float(import_ms), float(sample_ms)
+    raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "no sample taken")
+
+
+def main():
+    args = sys.argv[1:]
+    max_ms = None
+    if "--max-ms" in args:
+        i = args.index("--max-ms")
+        max_ms = float(args[i + 1])
+        del args[i:i + 2]
+    runs = int(args[0]) if args else DEFAULT_RUNS
+
+    print("=" * 50)
+    print("Startup Benchmark")
+    print(f"Python: {sys.executable}")
+    print("=" * 50)
+
+    modules = import_profile()
+    # -X importtime prints children before their parent, main's own imports are the lines just above it
+    main_index = next(i for i, (cumulative, depth, name) in enumerate(modules) if name == "main")
+    total, main_depth, _ = modules[main_index]
+    direct = []
+    for cumulative, depth, name in reversed(modules[:main_index]):
+        if depth <= main_depth:
+            break
+        if depth == main_depth + 1:
+            direct.append((cumulative, name))
+    print(f"\nimport main: {total / 1000:.1f} ms cumulative, its imports by cost:")
+    for cumulative, name in sorted(direct, reverse=True)[:10]:
+        print(f"  {name:24} {cumulative / 1000:8.1f} ms")
+
+    walls, imports, samples = [], [], []
+    for i in range(runs):
+        wall, import_ms, sample_ms = first_sample_run()
+        walls.append(wall)
+        imports.append(import_ms)
+        samples.append(sample_ms)
+
+    print(f"\nFirst sample, median of {runs} fresh interpreters:")
+    print(f"  import main:                    {statistics.median(imports):.1f} ms")
+    print(f"  script start to first sample:   {statistics.median(samples):.1f} ms")
+    print(f"  process spawn to exit (wall):   {statistics.median(walls):.1f} ms")
+
+    if max_ms is not None and statistics.median(samples) > max_ms:
+        print(f"\nFAIL: first sample at {statistics.median(samples):.1f} ms is over the {max_ms:.0f} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Upload bundle size benchmark: the old indent=2 json bundle vs the streamed compact and gzipped bodies
+Builds a synthetic data log in a temp directory, nothing in the working directory is touched
+
+usage: python bench_upload.py [link kbit/s]   (default 1000, used for the transfer time estimate)
+"""
+
+import os
+import sys
+import json
+import gzip
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+import web_server
+
+DEFAULT_LINK_KBPS = 1000
+
+
+def write_noisy_csv(path, rows, start):
+    """readings 15 minutes apart with full float precision noise, like real window averages (compress worse than round numbers)"""
+    with open(path, 'w') as f:
+        f.write("timestamp,exterior_temp,enclosure_temp,humidity,pressure\n")
+        for i in range(rows):
+            timestamp = (start + timedelta(minutes=15 * i)).strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"{timestamp},{random.gauss(15, 5)},{random.gauss(25, 3)},{random.gauss(60, 10)},{random.gauss(1013, 5)}\n")
+
+
+def bench_bundle(label, days, link_kbps):
+    """one bundle covering the last `days` days of 15 minute readings"""
+    end = datetime(2026, 1, 1)
+    start = end - timedelta(days=days)
+    write_noisy_csv(os.path.join(os.getcwd(), web_server.WEATHER_DATA_FILE), days * 96, start + timedelta(minutes=15))
+
+    # legacy: whole bundle in memory, indent=2, uncompressed
+    web_server.save_last_upload_time(start)
+    began = time.perf_counter()
+    legacy = json.dumps(web_server.prepare_upload_data(), indent=2).encode('utf-8')
+    legacy_time = time.perf_counter() - began
+
+    results = [("indent=2 json (old)", len(legacy), legacy_time)]
+    bodies = {}
+    for name, compress in (("compact json", False), ("compact json + gzip", True)):
+        began = time.perf_counter()
+        body = b"".join(web_server.iter_upload_body(web_server.iter_upload_json(start, end), compress=compress))
+        results.append((name, len(body), time.perf_counter() - began))
+        bodies[compress] = body
+
+    # the streamed bodies carry the same data as the old bundle
+    streamed = json.loads(gzip.decompress(bodies[True]))
+    assert streamed == json.loads(bodies[False])
+    assert streamed['weather_data'] == json.loads(legacy)['weather_data']
+
+    print(f"\n{label}: {days * 96} readings")
+    for name, size, elapsed in results:
+        transfer = size * 8 / (link_kbps * 1000)
+        print(f"  {name + ':':22} {size:9} bytes, built in {elapsed * 1000:6.1f} ms, ~{transfer:6.2f} s at {link_kbps} kbit/s")
+    print(f"  reduction:             {results[0][1] / results[-1][1]:.1f}x")
+
+
+def main():
+    link_kbps = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LINK_KBPS
+
+    print("=" * 50)
+    print("Upload Bundle Benchmark")
+    print("=" * 50)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            bench_bundle("Daily bundle", 1, link_kbps)
+            bench_bundle("7-day backlog bundle", 7, link_kbps)
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
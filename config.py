@@ -8,6 +8,20 @@ WITTY_PI_SLEEP = False # signals whether to use python time.sleep (False) or rel
 AVERAGING_PERIOD = 15  #30      # seconds to average readings over X
 READING_INTERVAL = 0.5         # seconds between individual readings X
 MAIN_LOOP_INTERVAL = 15*60     # 15 minutes between sensor cycles (15 * 60) = 900 s
+SHT30_MODE = "single"          # "single" shot per reading, or "periodic" acquisition running through the averaging window
+SHT30_REPEATABILITY = "high"   # "high", "medium" or "low" (15.5 / 6.5 / 4.5 ms conversions)
+SHT30_MPS = 2                  # periodic mode measurements per second: 0.5, 1, 2, 4 or 10 (match READING_INTERVAL)
+BMP388_FIFO = False            # let the BMP388 buffer samples in its hardware FIFO through the averaging window, drained in one burst
+BMP388_FIFO_ODR = 0x06         # FIFO output data rate select: 0x05 = 6.25 Hz, 0x06 = 3.1 Hz, 0x07 = 1.5 Hz (FIFO holds 73 frames)
+BMP388_CALIBRATION_CACHE = "bmp388_calibration.json"  # parsed calibration coefficients, skips the calibration read on boot (None to disable)
+ADAPTIVE_AVERAGING = False     # end the averaging window early once every channel's standard error is within ADAPTIVE_TOLERANCE
+ADAPTIVE_MIN_PERIOD = 3        # seconds sampled before an adaptive window may stop, AVERAGING_PERIOD is the upper bound
+ADAPTIVE_TOLERANCE = {         # standard error of the window mean allowed per channel (C, C, %RH, hPa)
+    'exterior_temp': 0.05,
+    'enclosure_temp': 0.05,
+    'humidity': 0.2,
+    'pressure': 0.05,
+}
 
 # GPIO Pin Assignments  
 SHUTDOWN_SIGNAL_PIN = 29              # 
@@ -22,16 +36,37 @@ DISPLAY_BUSY_PIN = 17        # E-ink display busy
 WEATHER_DATA_FILE = "weather_data.csv"
 ERROR_LOG_FILE = "error_log.csv"
 LAST_UPLOAD_FILE = "last_upload.txt"
+UPLOAD_CURSOR_FILE = "upload_cursor.json"  # byte offset uploaded so far in each log, with the file identity it belongs to
 LAST_CLEANUP_FILE = "last_cleanup.txt"
 
+# Storage Backend
+DATA_BACKEND = "csv"                   # "csv" writes WEATHER_DATA_FILE, "binary" writes fixed-width records to WEATHER_BINARY_FILE,
+                                       # "partitioned" writes one csv per month to WEATHER_DATA_DIR/YYYY-MM.csv
+WEATHER_BINARY_FILE = "weather_data.bin"
+WEATHER_DATA_DIR = "weather_data"
+INDEX_STRIDE_BYTES = 64 * 1024         # csv backend keeps a (timestamp, offset) entry in WEATHER_DATA_FILE.idx every ~64 KB (~1400 rows)
+ROLLUPS_ENABLED = True                 # keep count/sum/min/max summaries per hour, day and month next to the raw data
+ROLLUP_FILES = {
+    "hourly": "rollup_hourly.csv",
+    "daily": "rollup_daily.csv",
+    "monthly": "rollup_monthly.csv",
+}
+
 # Upload Settings
 COPYPARTY_SERVER = "192.168.12.209"    # Your server IP
 COPYPARTY_PORT = 3923
 COPYPARTY_USERNAME = "weathergage"
 COPYPARTY_PASSWORD = "climate_change"   # You'll set this
 UPDATE_FLAG = "weather//update_flag.txt"
+UPDATE_FLAG_CACHE_FILE = "update_flag_cache.json"  # ETag / Last-Modified of the flag at the last git pull, an unchanged flag is skipped
 UPLOAD_INTERVAL_HOURS = 24
-UPLOAD_RETRY_INTERVAL_HOURS = 1
+UPLOAD_RETRY_BASE_MINUTES = 15        # first retry after a failed upload, doubling with each further failure
+UPLOAD_RETRY_MAX_HOURS = 12            # longest wait between retries
+UPLOAD_FAILURES_FILE = "upload_failures.txt"
+UPLOAD_CHUNK_ROWS = 2000               # rows per uploaded bundle file (~3 weeks of readings), a backlog goes up as several
+UPLOAD_COMPRESS = True                 # gzip the upload bundle, uploaded as weather_bundle_*.json.gz
+UPLOAD_GZIP_LEVEL = 6
+UPLOAD_STREAM_BYTES = 64 * 1024        # each bundle is streamed to the server in pieces of about this size
 
 # WiFi Hotspot Settings (if you implement it later)
 HOTSPOT_SSID = "WeatherStation_001"
@@ -41,6 +76,12 @@ HOTSPOT_IP = "192.168.4.1"
 # Data Management
 CLEANUP_INTERVAL_DAYS = 3650           # 10 years in days
 INVALID_READING = -9999                # Sentinel value for bad readings
+FREE_SPACE_RECORDS = 500               # weather records dropped per disk-full recovery (1/5 as many error log lines)
+RAW_CAPTURE = False                    # keep every sample's raw SHT30 words / BMP388 counts in RAW_CAPTURE_FILE for reprocessing (reprocess_raw.py)
+RAW_CAPTURE_FILE = "raw_capture.bin"
+RAW_CAPTURE_MAX_BYTES = 4 * 1024 * 1024  # ring buffer size, oldest frames are overwritten (~145k frames of 29 bytes)
+LOG_EXTRA_STATS = False                # csv/partitioned backends also log per-channel std/min/max/valid/invalid plus sample count and stop reason for each window (start a fresh data file when enabling)
+STREAM_MEDIAN = False                  # track a streaming (P-squared) median per channel, logged as <channel>_median with LOG_EXTRA_STATS
 
 # Physical Constants (when you add pressure correction later)
 ELEVATION_METERS = 34                 # Your elevation above sea level
\ No newline at end of file
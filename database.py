@@ -1,31 +1,47 @@
 import os
+import mmap
+import struct
+import calendar
+import bisect
+import re
+import errno
+import shutil
 from datetime import datetime, timedelta
 # database.py  
-from config import WEATHER_DATA_FILE, ERROR_LOG_FILE
+from config import WEATHER_DATA_FILE, ERROR_LOG_FILE, WEATHER_BINARY_FILE, DATA_BACKEND, INVALID_READING, INDEX_STRIDE_BYTES, WEATHER_DATA_DIR, FREE_SPACE_RECORDS, ROLLUPS_ENABLED, ROLLUP_FILES, LOG_EXTRA_STATS, STREAM_MEDIAN, RAW_CAPTURE_FILE, RAW_CAPTURE_MAX_BYTES
+
+DATA_KEYS = ['timestamp', 'exterior_temp', 'enclosure_temp', 'humidity', 'pressure']
+DATA_HEADER = "timestamp,exterior_temp,enclosure_temp,humidity,pressure\n"
+
+# optional per-window statistics from sensors._sample_window(), logged after the five data columns
+EXTRA_STATS = ("std", "min", "max", "valid", "invalid") + (("median",) if STREAM_MEDIAN else ())
+EXTRA_STAT_KEYS = [f"{key}_{stat}" for key in DATA_KEYS[1:] for stat in EXTRA_STATS]
+EXTRA_STAT_KEYS += ["samples", "missed_slots", "stop_reason", "window_s"]  # how the window itself went
+if LOG_EXTRA_STATS:
+    DATA_HEADER = DATA_HEADER.rstrip("\n") + "," + ",".join(EXTRA_STAT_KEYS) + "\n"
+
+def _format_line(sensor_data:dict):
+    """one csv data line, without the newline. readers only rely on the first five columns"""
+    line = ",".join(str(sensor_data[key]) for key in DATA_KEYS)
+    if LOG_EXTRA_STATS:
+        line += "," + ",".join(str(sensor_data.get(key, INVALID_READING)) for key in EXTRA_STAT_KEYS)
+    return line
+
+# binary record layout: epoch seconds (int64) followed by the four channels (float64), little endian
+RECORD_FORMAT = '<q4d'
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)  # 40 bytes
 
 def update_datalog(sensor_data:dict):
     """
-    function that takes in a dict of sensor data and writes it to a file named 'WEATHER_DATA_FILE' in the working directory.
+    function that takes in a dict of sensor data and writes it to the configured data store in the working directory.
+    DATA_BACKEND "csv" appends a line to 'WEATHER_DATA_FILE', "binary" appends a fixed-width record to 'WEATHER_BINARY_FILE'
     assumes keys are timestamp, exterioro_temp, enclosure_temp, humidity, pressure
     """ 
     try:
-        # get directory name and file name
-        wkdirectory = os.getcwd()
-        data_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
-
-        keys = ['timestamp', 'exterior_temp', 'enclosure_temp', 'humidity', 'pressure']
-        new_line = ",".join(str(sensor_data[key]) for key in keys)
-        if os.path.isfile(data_path):
-            # csv file already exists in this location. just append to end of file
-            with open(data_path, 'a') as f:
-                f.write(f"{new_line}\n")
-            return "data appended to existing file"
-        else:
-            # csv file does not exist in this location, create one and add headers and data
-            with open(data_path, 'w') as f:
-                f.write(f"timestamp,exterior_temp,enclosure_temp,humidity,pressure\n")
-                f.write(f"{new_line}\n")
-            return "new file created with data"
+        result = _append_reading(sensor_data)
+        if ROLLUPS_ENABLED:
+            update_rollups(sensor_data)
+        return result
     except KeyError as e:
         error_msg = f"Missing sensor data key: {str(e)}"
         log_error(error_msg)
@@ -35,35 +51,595 @@ def update_datalog(sensor_data:dict):
         if "No space left" in str(e) or "Disk full" in str(e):
             free_result = free_disk_space()
             try:
-                # get directory name and file name
-                wkdirectory = os.getcwd()
-                data_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
-
-                keys = ['timestamp', 'exterior_temp', 'enclosure_temp', 'humidity', 'pressure']
-                new_line = ",".join(str(sensor_data[key]) for key in keys)
-                with open(data_path, 'a') as f:
-                    f.write(f"{new_line}\n")
-                return "data written after freeing space: {free_result}"
+                _append_reading(sensor_data)
+                if ROLLUPS_ENABLED:
+                    update_rollups(sensor_data)
+                return f"data written after freeing space: {free_result}"
             except OSError:
                 return "Error: still no disk space after cleanup"
         else:
             return f"Error: write failed: {str(e)}"
     except Exception as e:
         return f"Error: unexpected error: {str(e)}"
+
+def _append_reading(sensor_data:dict):
+    """write one reading to the configured backend, raises KeyError/OSError for update_datalog to handle"""
+    if DATA_BACKEND == "binary":
+        return append_binary_record(sensor_data)
+    if DATA_BACKEND == "partitioned":
+        return append_partitioned(sensor_data)
+
+    # get directory name and file name
+    wkdirectory = os.getcwd()
+    data_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
+
+    new_line = _format_line(sensor_data)
+    if os.path.isfile(data_path):
+        # csv file already exists in this location. just append to end of file
+        offset = os.path.getsize(data_path)
+        with open(data_path, 'a') as f:
+            f.write(f"{new_line}\n")
+        update_index(data_path, sensor_data['timestamp'], offset)
+        return "data appended to existing file"
+    else:
+        # csv file does not exist in this location, create one and add headers and data
+        with open(data_path, 'w') as f:
+            f.write(DATA_HEADER)
+            f.write(f"{new_line}\n")
+        update_index(data_path, sensor_data['timestamp'], len(DATA_HEADER))
+        return "new file created with data"
+
+# sparse timestamp index for the csv backend
+def index_path_for(data_path:str):
+    """sidecar index file that belongs to a csv data file"""
+    return data_path + ".idx"
+
+def invalidate_index(data_path:str):
+    """remove the sidecar index after the data file was rewritten, it is rebuilt on next use"""
+    try:
+        os.remove(index_path_for(data_path))
+    except OSError:
+        pass
+
+def _row_timestamp(line:bytes):
+    """timestamp at the start of a raw csv row, None for a malformed row that the index skips"""
+    timestamp_str = line[:19].decode('ascii', 'replace')
+    if len(timestamp_str) == 19 and ',' not in timestamp_str:
+        return timestamp_str
+    return None
+
+def _first_row_offset(f, offset:int):
+    """offset of the first row from `offset` on that rebuild_index would index, None if there is none"""
+    f.seek(offset)
+    for line in f:
+        if _row_timestamp(line) is not None:
+            return offset
+        offset += len(line)
+    return None
+
+def rebuild_index(data_path:str):
+    """
+    scan the csv data file once and write a (timestamp, byte offset) entry for the first row
+    and then for the first row after every INDEX_STRIDE_BYTES
+    """
+    entries = []
+    with open(data_path, 'rb') as f:
+        offset = len(f.readline())  # skip header
+        last_indexed = None
+        for line in f:
+            if last_indexed is None or offset - last_indexed >= INDEX_STRIDE_BYTES:
+                timestamp_str = _row_timestamp(line)
+                if timestamp_str is not None:
+                    entries.append((timestamp_str, offset))
+                    last_indexed = offset
+            offset += len(line)
+
+    index_path = index_path_for(data_path)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(f"{timestamp_str},{entry_offset}\n" for timestamp_str, entry_offset in entries)
+    os.replace(tmp_path, index_path)
+    return entries
+
+def _index_entry_matches(f, timestamp_str:str, offset:int):
+    """check that the row at `offset` still starts with `timestamp_str`"""
+    f.seek(offset)
+    return f.read(19) == timestamp_str.encode('ascii')
+
+def load_index(data_path:str):
+    """
+    load the sidecar index for a csv data file as a list of (timestamp, offset).
+    a missing, unreadable or stale index (data file truncated or rewritten underneath it) is rebuilt
+    """
+    entries = []
+    try:
+        with open(index_path_for(data_path), 'r') as f:
+            for line in f:
+                timestamp_str, offset = line.rstrip('\n').split(',')
+                entries.append((timestamp_str, int(offset)))
+    except (OSError, ValueError):
+        return rebuild_index(data_path)
+
+    if not entries:
+        return rebuild_index(data_path)
+
+    # spot check the first and last entries, any rewrite of the data file moves the rows they point at.
+    # the first entry is the first well-formed row, which is not right after the header if malformed rows lead
+    with open(data_path, 'rb') as f:
+        header_length = len(f.readline())
+        first_timestamp, first_offset = entries[0]
+        last_timestamp, last_offset = entries[-1]
+        if (first_offset != _first_row_offset(f, header_length)
+                or not _index_entry_matches(f, first_timestamp, first_offset)
+                or not _index_entry_matches(f, last_timestamp, last_offset)):
+            return rebuild_index(data_path)
+    return entries
+
+def update_index(data_path:str, timestamp_str:str, offset:int):
+    """
+    keep the sidecar index current after appending the row that starts at `offset`.
+    the index can always be rebuilt from the data, so failures here never fail the data write
+    """
+    try:
+        entries = load_index(data_path)
+        if entries and offset - entries[-1][1] >= INDEX_STRIDE_BYTES:
+            with open(index_path_for(data_path), 'a') as f:
+                f.write(f"{timestamp_str},{offset}\n")
+    except Exception:
+        invalidate_index(data_path)
+
+def find_start_offset(data_path:str, start_str:str):
+    """byte offset to start scanning from so that no row at or after `start_str` is missed"""
+    entries = load_index(data_path)
+    i = bisect.bisect_left([timestamp_str for timestamp_str, offset in entries], start_str)
+    if i == 0:
+        return None  # start before the first indexed row, scan from the top
+    return entries[i - 1][1]
+
+def find_end_offset(data_path:str, end_str:str):
+    """byte offset to stop reading at, every row at or before `end_str` lies before it (None = end of file)"""
+    entries = load_index(data_path)
+    i = bisect.bisect_right([timestamp_str for timestamp_str, offset in entries], end_str)
+    if i == len(entries):
+        return None
+    return entries[i][1]
+
+# fast fixed-width timestamp handling
+# "YYYY-MM-DD HH:MM:SS" sorts lexicographically in time order, so range filters compare the raw strings
+# the pattern range-checks each field, only impossible dates such as Feb 30 get past it (timestamp_to_epoch rejects those)
+TIMESTAMP_PATTERN = re.compile(r"\d{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12]\d|3[01]) (?:[01]\d|2[0-3]):[0-5]\d:[0-5]\d")
+_day_epoch_cache = {}
+
+def is_timestamp(timestamp_str:str):
+    """cheap check for a "YYYY-MM-DD HH:MM:SS" timestamp with fields in range, replaces strptime as the malformed-row filter"""
+    return TIMESTAMP_PATTERN.fullmatch(timestamp_str) is not None
+
+def _day_epoch(date_str:str):
+    """epoch of midnight for a "YYYY-MM-DD" prefix, validated and cached since every row of a day shares it"""
+    epoch = _day_epoch_cache.get(date_str)
+    if epoch is None:
+        day = datetime(int(date_str[0:4]), int(date_str[5:7]), int(date_str[8:10]))
+        epoch = calendar.timegm(day.timetuple())
+        if len(_day_epoch_cache) > 4096:
+            _day_epoch_cache.clear()
+        _day_epoch_cache[date_str] = epoch
+    return epoch
+
+def timestamp_to_epoch(timestamp_str:str):
+    """
+    convert a "YYYY-MM-DD HH:MM:SS" station timestamp to integer seconds by slicing the fixed-width fields.
+    the station clock is naive local time, so it is encoded as if it were UTC; this round-trips exactly
+    and keeps records ordered across DST changes
+    """
+    if not is_timestamp(timestamp_str):
+        raise ValueError(f"time data {timestamp_str!r} does not match format '%Y-%m-%d %H:%M:%S'")
+    hours = int(timestamp_str[11:13])
+    minutes = int(timestamp_str[14:16])
+    seconds = int(timestamp_str[17:19])
+    return _day_epoch(timestamp_str[:10]) + hours * 3600 + minutes * 60 + seconds
+
+def epoch_to_timestamp(epoch:int):
+    """inverse of timestamp_to_epoch"""
+    return (datetime(1970, 1, 1) + timedelta(seconds=epoch)).strftime("%Y-%m-%d %H:%M:%S")
+
+def _range_bounds(start_date=None, end_date=None, last_n_days=None):
+    """
+    normalise the start_date/end_date/last_n_days arguments of the read functions to timestamp strings.
+    datetimes with a fractional second start at the next whole second, matching a datetime comparison
+    """
+    if last_n_days:
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=last_n_days)
+
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S")
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
+
+    start_str = None
+    end_str = None
+    if start_date:
+        if start_date.microsecond:
+            start_date = start_date.replace(microsecond=0) + timedelta(seconds=1)
+        start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
+    if end_date:
+        end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
+    return start_str, end_str
+
+# binary record store
+def _format_value(value):
+    """format a stored channel value the way the csv backend writes it"""
+    return str(INVALID_READING) if value == INVALID_READING else str(value)
+
+def pack_record(sensor_data:dict):
+    """pack a sensor data dict into one fixed-width binary record"""
+    return struct.pack(
+        RECORD_FORMAT,
+        timestamp_to_epoch(sensor_data['timestamp']),
+        *(float(sensor_data[key]) for key in DATA_KEYS[1:])
+    )
+
+def unpack_record(buffer, offset=0):
+    """unpack the record at `offset` in `buffer` into the same dict of strings read_data_range returns"""
+    epoch, *values = struct.unpack_from(RECORD_FORMAT, buffer, offset)
+    data_dict = {'timestamp': epoch_to_timestamp(epoch)}
+    for key, value in zip(DATA_KEYS[1:], values):
+        data_dict[key] = _format_value(value)
+    return data_dict
+
+class WeatherRecord:
+    """
+    Compact typed weather reading: epoch seconds plus float channels, None for INVALID_READING.
+    returned by the read functions with as_records=True, uses a fraction of the memory of the row dicts
+    """
+    __slots__ = ('epoch', 'exterior_temp', 'enclosure_temp', 'humidity', 'pressure')
+
+    def __init__(self, epoch, exterior_temp, enclosure_temp, humidity, pressure):
+        self.epoch = epoch
+        self.exterior_temp = exterior_temp
+        self.enclosure_temp = enclosure_temp
+        self.humidity = humidity
+        self.pressure = pressure
+
+    @staticmethod
+    def _channel(value):
+        value = float(value)
+        return None if value == INVALID_READING else value
+
+    @classmethod
+    def from_values(cls, epoch, *values):
+        """build from an epoch and the four raw channel values (strings or numbers)"""
+        return cls(epoch, *(cls._channel(value) for value in values))
+
+    @property
+    def timestamp(self):
+        """timestamp string of the reading, YYYY-MM-DD HH:MM:SS"""
+        return epoch_to_timestamp(self.epoch)
+
+    def to_dict(self):
+        """same dict of strings read_data_range returns, for JSON uploads"""
+        data_dict = {'timestamp': self.timestamp}
+        for key in DATA_KEYS[1:]:
+            value = getattr(self, key)
+            data_dict[key] = str(INVALID_READING) if value is None else str(value)
+        return data_dict
+
+    def __eq__(self, other):
+        if not isinstance(other, WeatherRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"WeatherRecord({self.timestamp!r}, exterior_temp={self.exterior_temp}, "
+                f"enclosure_temp={self.enclosure_temp}, humidity={self.humidity}, pressure={self.pressure})")
+
+def append_binary_record(sensor_data:dict, bin_path=None):
+    """
+    append one record to the binary data file. a partial record left by a power cut
+    mid-write is truncated first so record N always sits at offset N * RECORD_SIZE
+    """
+    if bin_path is None:
+        bin_path = os.path.join(os.getcwd(), WEATHER_BINARY_FILE)
+    record = pack_record(sensor_data)
+
+    existed = os.path.isfile(bin_path)
+    with open(bin_path, 'ab') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size % RECORD_SIZE:
+            f.truncate(size - size % RECORD_SIZE)
+        f.write(record)
+    return "data appended to existing file" if existed else "new file created with data"
+
+def _record_epoch(buffer, index:int):
+    """epoch of record `index` without unpacking the channels"""
+    return struct.unpack_from('<q', buffer, index * RECORD_SIZE)[0]
+
+def _bisect_records(buffer, n_records:int, epoch:int):
+    """index of the first record with timestamp >= epoch (records are appended in time order)"""
+    lo, hi = 0, n_records
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _record_epoch(buffer, mid) < epoch:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def iter_binary_range(start_epoch=None, end_epoch=None, bin_path=None, as_records=False):
+    """
+    yield records between two epochs (inclusive) from the binary data file, as dicts or WeatherRecords.
+    the start is located by bisection over the mmap, so only the requested records are unpacked
+    """
+    if bin_path is None:
+        bin_path = os.path.join(os.getcwd(), WEATHER_BINARY_FILE)
+
+    with open(bin_path, 'rb') as f:
+        n_records = os.fstat(f.fileno()).st_size // RECORD_SIZE
+        if n_records == 0:
+            return  # mmap cannot map an empty file
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            first = 0 if start_epoch is None else _bisect_records(mm, n_records, start_epoch)
+            for i in range(first, n_records):
+                if end_epoch is not None and _record_epoch(mm, i) > end_epoch:
+                    break
+                if as_records:
+                    yield WeatherRecord.from_values(*struct.unpack_from(RECORD_FORMAT, mm, i * RECORD_SIZE))
+                else:
+                    yield unpack_record(mm, i * RECORD_SIZE)
+
+def read_binary_range(start_epoch=None, end_epoch=None, bin_path=None, as_records=False):
+    """list version of iter_binary_range"""
+    return list(iter_binary_range(start_epoch, end_epoch, bin_path, as_records))
+
+def remove_oldest_records(bin_path:str, count:int):
+    """drop the oldest `count` records from the binary data file in one pass"""
+    if not os.path.isfile(bin_path):
+        return "file does not exist"
+
+    n_records = os.path.getsize(bin_path) // RECORD_SIZE
+    count = min(count, n_records)
+    if count == 0:
+        return "no data lines to remove"
+
+    rewrite_from_offset(bin_path, 0, count * RECORD_SIZE)
+    return f"{count} oldest records removed successfully"
+
+def count_records_before(bin_path:str, epoch:int):
+    """number of records older than `epoch` in the binary data file"""
+    with open(bin_path, 'rb') as f:
+        n_records = os.fstat(f.fileno()).st_size // RECORD_SIZE
+        if n_records == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _bisect_records(mm, n_records, epoch)
+
+def convert_csv_to_binary(csv_path=None, bin_path=None):
+    """
+    one-shot converter from the csv data file to the binary record file.
+    streams the csv, writes to a temp file and renames it into place, skipping malformed lines.
+    run once, then set DATA_BACKEND = "binary" in config.py
+    """
+    wkdirectory = os.getcwd()
+    if csv_path is None:
+        csv_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
+    if bin_path is None:
+        bin_path = os.path.join(wkdirectory, WEATHER_BINARY_FILE)
+
+    if not os.path.isfile(csv_path):
+        return "No weather data file found"
+
+    tmp_path = bin_path + ".tmp"
+    converted = 0
+    skipped = 0
+    try:
+        with open(csv_path, 'r') as src, open(tmp_path, 'wb') as dst:
+            next(src, None)  # skip header
+            for line in src:
+                try:
+                    parts = line.strip().split(',')
+                    dst.write(pack_record(dict(zip(DATA_KEYS, parts[:5]))))
+                    converted += 1
+                except (ValueError, KeyError, struct.error):
+                    skipped += 1
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, bin_path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return f"Error: conversion failed: {str(e)}"
+
+    return f"converted {converted} records to {os.path.basename(bin_path)}, skipped {skipped} malformed lines"
         
+# monthly partitions
+PARTITION_NAME = re.compile(r"^(\d{4}-\d{2})\.csv$")
+
+def partition_path_for(timestamp_str:str, data_dir=None):
+    """monthly partition file a "YYYY-MM-DD HH:MM:SS" timestamp belongs to"""
+    if data_dir is None:
+        data_dir = os.path.join(os.getcwd(), WEATHER_DATA_DIR)
+    return os.path.join(data_dir, f"{timestamp_str[:7]}.csv")
+
+def list_partitions(data_dir=None):
+    """list of (month "YYYY-MM", path) for every partition file, oldest first"""
+    if data_dir is None:
+        data_dir = os.path.join(os.getcwd(), WEATHER_DATA_DIR)
+    if not os.path.isdir(data_dir):
+        return []
+
+    partitions = []
+    for name in os.listdir(data_dir):
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions.append((match.group(1), os.path.join(data_dir, name)))
+    return sorted(partitions)
+
+def append_partitioned(sensor_data:dict):
+    """append one reading to the partition for its month, creating the directory/file as needed"""
+    new_line = _format_line(sensor_data)
+    partition_path = partition_path_for(sensor_data['timestamp'])
+
+    if os.path.isfile(partition_path):
+        with open(partition_path, 'a') as f:
+            f.write(f"{new_line}\n")
+        return "data appended to existing file"
+    else:
+        os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+        with open(partition_path, 'w') as f:
+            f.write(DATA_HEADER)
+            f.write(f"{new_line}\n")
+        return "new file created with data"
+
+def migrate_to_partitions(csv_path=None, data_dir=None):
+    """
+    split the single csv data file into monthly partitions in one streaming pass.
+    the partitions are built in a temp directory that is renamed into place, the source file is left untouched.
+    run once, then set DATA_BACKEND = "partitioned" in config.py
+    """
+    wkdirectory = os.getcwd()
+    if csv_path is None:
+        csv_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
+    if data_dir is None:
+        data_dir = os.path.join(wkdirectory, WEATHER_DATA_DIR)
+
+    if not os.path.isfile(csv_path):
+        return "No weather data file found"
+    if os.path.exists(data_dir):
+        return f"Error: {os.path.basename(data_dir)} already exists, not migrating over it"
+
+    tmp_dir = data_dir + ".tmp"
+    # partitions are opened for append, so a temp dir left by a failed run would double its months
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    migrated = 0
+    skipped = 0
+    current_month = None
+    out = None
+    try:
+        os.makedirs(tmp_dir)
+        with open(csv_path, 'r') as src:
+            next(src, None)  # skip header
+            for line in src:
+                month = line[:7]
+                if len(line) < 19 or not PARTITION_NAME.match(f"{month}.csv"):
+                    skipped += 1
+                    continue
+                if month != current_month:
+                    if out:
+                        out.close()
+                    partition_path = partition_path_for(line, tmp_dir)
+                    is_new = not os.path.isfile(partition_path)
+                    out = open(partition_path, 'a')
+                    if is_new:
+                        out.write(DATA_HEADER)
+                    current_month = month
+                out.write(line if line.endswith("\n") else f"{line}\n")
+                migrated += 1
+        if out:
+            out.close()
+        os.rename(tmp_dir, data_dir)
+    except OSError as e:
+        if out:
+            out.close()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return f"Error: migration failed: {str(e)}"
+
+    return f"migrated {migrated} records into {len(list_partitions(data_dir))} monthly partitions, skipped {skipped} malformed lines"
+
+# tail reader
+def read_last_records(path:str, n:int=1, block_size:int=4096):
+    """
+    return the last `n` rows of a csv file (oldest first, newline stripped, header excluded).
+    lines that don't start with a full timestamp (continuation lines of multi-line messages, a torn last line)
+    are skipped. reads backwards from the end in blocks, so the cost depends on n and not on the file size
+    """
+    if n <= 0:
+        return []
+    rows = []
+    for line in iter_records_backwards(path, block_size):
+        if is_timestamp(line.split(',', 1)[0]):
+            rows.append(line)
+            if len(rows) == n:
+                break
+    return rows[::-1]
+
+def iter_records_backwards(path:str, block_size:int=4096):
+    """
+    yield the data lines of a csv file newest first (newline stripped, header excluded), reading backwards in blocks.
+    for callers that have to skip non-row lines (continuation lines of multi-line messages) to reach a row
+    """
+    if not os.path.isfile(path):
+        return
+
+    with open(path, 'rb') as f:
+        header_length = len(f.readline())
+        position = f.seek(0, os.SEEK_END)
+        tail = b""
+        while position > header_length:
+            read_size = min(block_size, position - header_length)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + tail).split(b"\n")
+            tail = lines.pop(0)  # may continue in the block before
+            for line in reversed(lines):
+                if line:
+                    yield line.decode('utf-8', 'replace')
+        if tail:
+            yield tail.decode('utf-8', 'replace')
+
+def read_last_reading():
+    """
+    most recent weather reading as a dict, or None if there is no data.
+    the binary backend reads the final record directly, csv walks back to the last well-formed row
+    """
+    wkdirectory = os.getcwd()
+    if DATA_BACKEND == "binary":
+        bin_path = os.path.join(wkdirectory, WEATHER_BINARY_FILE)
+        if not os.path.isfile(bin_path):
+            return None
+        with open(bin_path, 'rb') as f:
+            n_records = os.fstat(f.fileno()).st_size // RECORD_SIZE
+            if n_records == 0:
+                return None
+            f.seek((n_records - 1) * RECORD_SIZE)
+            return unpack_record(f.read(RECORD_SIZE))
+
+    if DATA_BACKEND == "partitioned":
+        paths = [path for month, path in reversed(list_partitions())]
+    else:
+        paths = [os.path.join(wkdirectory, WEATHER_DATA_FILE)]
+
+    for path in paths:
+        for line in iter_records_backwards(path):
+            parts = line.strip().split(',')
+            if len(parts) >= 5 and is_timestamp(parts[0]):
+                return dict(zip(DATA_KEYS, parts[:5]))
+    return None
+
 def free_disk_space():
     """
     Remove old data to free disk space
-    Removes 5 weather data lines for every 1 error log line
+    Removes FREE_SPACE_RECORDS weather records and a fifth as many error log lines, each file in a single pass
     """
     removed_count = 0
-    for i in range(5):
-        result = remove_oldest_line(WEATHER_DATA_FILE)
+    if DATA_BACKEND == "binary":
+        result = remove_oldest_records(WEATHER_BINARY_FILE, FREE_SPACE_RECORDS)
         if "successfully" in result:
-            removed_count += 1
-        elif "no data lines" in result:
-            break
-    error_result = remove_oldest_line(ERROR_LOG_FILE)
+            removed_count = int(result.split()[0])
+    elif DATA_BACKEND == "partitioned" and len(list_partitions()) > 1:
+        # drop the whole oldest month, never the one currently being written
+        month, partition_path = list_partitions()[0]
+        with open(partition_path, 'rb') as f:
+            removed_count = max(sum(1 for line in f) - 1, 0)
+        os.remove(partition_path)
+    elif DATA_BACKEND == "partitioned":
+        partitions = list_partitions()
+        if partitions:
+            removed_count = compact_file(partitions[0][1], drop_rows=FREE_SPACE_RECORDS)
+    elif os.path.isfile(WEATHER_DATA_FILE):
+        removed_count = compact_file(WEATHER_DATA_FILE, drop_rows=FREE_SPACE_RECORDS)
+    if os.path.isfile(ERROR_LOG_FILE):
+        compact_file(ERROR_LOG_FILE, drop_rows=max(FREE_SPACE_RECORDS // 5, 1))
 
     log_error(f"Disk cleanup performed: removed {removed_count} records")
     return f"freed space: removed {removed_count} weather records"
@@ -97,15 +673,94 @@ def log_error(error_message:str):
     except Exception as e:
         return f"Failed to log error: {str(e)}"
 
+# compaction
+def _fsync_directory(file_path:str):
+    """flush the directory entry after a rename so it survives a power cut"""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+def _shift_in_place(file_path:str, header_length:int, keep_from:int):
+    """move everything from `keep_from` down to `header_length` and truncate, needs no free space"""
+    with open(file_path, 'r+b') as f:
+        read_pos = keep_from
+        write_pos = header_length
+        while True:
+            f.seek(read_pos)
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            f.seek(write_pos)
+            f.write(chunk)
+            read_pos += len(chunk)
+            write_pos += len(chunk)
+        f.truncate(write_pos)
+        f.flush()
+        os.fsync(f.fileno())
+
+def rewrite_from_offset(file_path:str, header_length:int, keep_from:int):
+    """
+    replace a file with its first `header_length` bytes followed by everything from `keep_from` on.
+    the result is streamed to a temp file and renamed over the original, so a power cut leaves either
+    the old or the new file. if the disk is too full for the temp copy the data is shifted in place instead
+    """
+    tmp_path = file_path + ".tmp"
+    try:
+        with open(file_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(src.read(header_length))
+            src.seek(keep_from)
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp_path, file_path)
+        _fsync_directory(file_path)
+    except OSError as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if e.errno != errno.ENOSPC:
+            raise
+        _shift_in_place(file_path, header_length, keep_from)
+
+def compact_file(file_path:str, cutoff_str=None, drop_rows:int=0):
+    """
+    remove the oldest rows of a csv file in a single streaming pass.
+    drops at least `drop_rows` rows and every leading row older than `cutoff_str` ("YYYY-MM-DD HH:MM:SS").
+    rows are time ordered, so the scan stops at the first row that is kept.
+    returns the number of rows removed
+    """
+    with open(file_path, 'rb') as f:
+        header_length = len(f.readline())
+        keep_from = header_length
+        removed = 0
+        for line in f:
+            timestamp_str = line[:19].decode('ascii', 'replace')
+            if removed < drop_rows:
+                pass
+            elif cutoff_str is None:
+                break
+            elif not is_timestamp(timestamp_str):
+                # Malformed line inside the expired block, drop it with its neighbours
+                log_error(f"Malformed line in {file_path}: {line.decode('utf-8', 'replace').strip()}")
+            elif timestamp_str >= cutoff_str:
+                break
+            keep_from += len(line)
+            removed += 1
+
+    if removed == 0:
+        return 0  # nothing expired, leave the file untouched
+
+    rewrite_from_offset(file_path, header_length, keep_from)
+    invalidate_index(file_path)
+    return removed
+
 def remove_oldest_line(file_path:str):
     if os.path.isfile(file_path):
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-        if len(lines) > 1:
-            del lines[1]
-
-            with open(file_path, 'w') as f:
-                f.writelines(lines)
+        if compact_file(file_path, drop_rows=1):
             return "oldest line removed successfully"
         else:
             return "no data lines to remove"
@@ -119,39 +774,43 @@ def cleanup_old_data(days_to_keep:int=3650):
         current_timestamp = datetime.now()
         
         total_removed = 0
+        removed_partitions = 0
+
+        if DATA_BACKEND == "binary":
+            # records are time ordered, so the expired ones are a prefix found by bisection
+            files = [os.path.join(wkdirectory, ERROR_LOG_FILE)]
+            bin_path = os.path.join(wkdirectory, WEATHER_BINARY_FILE)
+            if os.path.isfile(bin_path):
+                cutoff = current_timestamp - timedelta(days=days_to_keep)
+                records_to_remove = count_records_before(bin_path, calendar.timegm(cutoff.timetuple()))
+                if records_to_remove > 0:
+                    remove_oldest_records(bin_path, records_to_remove)
+                    total_removed += records_to_remove
+                    log_error(f"Cleanup: removed {records_to_remove} old records from {WEATHER_BINARY_FILE}")
+
+        if DATA_BACKEND == "partitioned":
+            # delete every month that ended before the cutoff, the month holding the cutoff is compacted below
+            files = [os.path.join(wkdirectory, ERROR_LOG_FILE)]
+            cutoff_month = (current_timestamp - timedelta(days=days_to_keep)).strftime("%Y-%m")
+            for month, partition_path in list_partitions():
+                if month > cutoff_month:
+                    break
+                if month == cutoff_month:
+                    files.append(partition_path)
+                    break
+                os.remove(partition_path)
+                removed_partitions += 1
+            if removed_partitions > 0:
+                log_error(f"Cleanup: removed {removed_partitions} monthly partitions older than {cutoff_month}")
         
+        # single streaming pass per file: expired rows are a prefix, the rest is copied to a temp file and renamed
+        cutoff_str = (current_timestamp - timedelta(days=days_to_keep)).strftime("%Y-%m-%d %H:%M:%S")
         for file in files:
             if not os.path.isfile(file):
                 continue  # Skip if file doesn't exist
             
             try:
-                with open(file, 'r') as f:
-                    file_lines = f.readlines()
-                
-                if len(file_lines) <= 1:  # Only header or empty
-                    continue
-                
-                lines_to_remove = 0
-                for i in range(1, len(file_lines)):  # Skip header
-                    line = file_lines[i]
-                    try:
-                        timestamp_str = line.split(",")[0]
-                        timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                        time_difference = current_timestamp - timestamp
-                        
-                        if time_difference.days >= days_to_keep:  # Line is old
-                            lines_to_remove += 1
-                        else:  # Found first recent line
-                            break
-                            
-                    except (ValueError, IndexError) as e:
-                        # Malformed timestamp or line, skip this line
-                        log_error(f"Malformed line in {file}: {line.strip()}")
-                        continue
-                
-                # Remove the old lines
-                for j in range(lines_to_remove):
-                    result = remove_oldest_line(file)
+                lines_to_remove = compact_file(file, cutoff_str=cutoff_str)
                 
                 if lines_to_remove > 0:
                     total_removed += lines_to_remove
@@ -161,6 +820,8 @@ def cleanup_old_data(days_to_keep:int=3650):
                 log_error(f"Cleanup failed for {file}: {str(e)}")
                 continue
         
+        if removed_partitions > 0:
+            return f"cleanup complete: removed {removed_partitions} monthly partitions and {total_removed} other records"
         return f"cleanup complete: removed {total_removed} total records"
         
     except Exception as e:
@@ -168,76 +829,591 @@ def cleanup_old_data(days_to_keep:int=3650):
         log_error(error_msg)
         return error_msg
 
-def read_data_range(start_date=None, end_date=None, last_n_days=None):
+def _iter_csv_rows(data_path:str, start_str=None, end_str=None, start_offset=None, as_records=False):
+    """
+    yield the rows of one csv data file between two "YYYY-MM-DD HH:MM:SS" bounds (inclusive), as dicts or WeatherRecords.
+    start_offset skips straight to a row boundary found through the sidecar index
+    """
+    with open(data_path, 'r') as f:
+        if start_offset is None:
+            f.readline()  # skip header
+        else:
+            f.seek(start_offset)
+
+        for line in f:
+            parts = line.strip().split(',')
+            timestamp_str = parts[0]
+            if len(parts) < 5 or not is_timestamp(timestamp_str):
+                # Skip malformed lines
+                continue
+            
+            # Apply date filtering on the raw strings, rows are in time order so stop at the first one past end_str
+            if start_str and timestamp_str < start_str:
+                continue
+            if end_str and timestamp_str > end_str:
+                return
+
+            if as_records:
+                try:
+                    yield WeatherRecord.from_values(timestamp_to_epoch(timestamp_str), *parts[1:5])
+                except ValueError:
+                    continue  # unparseable channel value
+                continue
+            
+            # Create data dictionary
+            yield {
+                'timestamp': timestamp_str,
+                'exterior_temp': parts[1],
+                'enclosure_temp': parts[2],
+                'humidity': parts[3],
+                'pressure': parts[4]
+            }
+
+def _weather_data_exists():
+    """check the configured backend has a data file to read"""
+    if DATA_BACKEND == "partitioned":
+        return bool(list_partitions())
+    data_file = WEATHER_BINARY_FILE if DATA_BACKEND == "binary" else WEATHER_DATA_FILE
+    return os.path.isfile(os.path.join(os.getcwd(), data_file))
+
+def iter_data_range(start_date=None, end_date=None, last_n_days=None, as_records=False):
     """
-    Read weather data with optional filtering
+    Generator version of read_data_range: reads the data incrementally, yields one dict per row
+    and stops at the first row past end_date. yields nothing if there is no data file
     
     Args:
         start_date: datetime object or string "YYYY-MM-DD HH:MM:SS"
         end_date: datetime object or string "YYYY-MM-DD HH:MM:SS" 
         last_n_days: int, get last N days of data
+        as_records: bool, yield WeatherRecord objects instead of dicts of strings
+    """
+    wkdirectory = os.getcwd()
+
+    # Work out the range once as timestamp strings, rows are filtered without building datetimes
+    start_str, end_str = _range_bounds(start_date, end_date, last_n_days)
+
+    if DATA_BACKEND == "binary":
+        bin_path = os.path.join(wkdirectory, WEATHER_BINARY_FILE)
+        if not os.path.isfile(bin_path):
+            return
+        start_epoch = timestamp_to_epoch(start_str) if start_str else None
+        end_epoch = timestamp_to_epoch(end_str) if end_str else None
+        yield from iter_binary_range(start_epoch, end_epoch, bin_path, as_records)
+
+    elif DATA_BACKEND == "partitioned":
+        # only open the months that overlap the query
+        first_month = start_str[:7] if start_str else None
+        last_month = end_str[:7] if end_str else None
+        for month, partition_path in list_partitions():
+            if first_month and month < first_month:
+                continue
+            if last_month and month > last_month:
+                break
+            yield from _iter_csv_rows(partition_path, start_str, end_str, as_records=as_records)
+
+    else:
+        data_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
+        if not os.path.isfile(data_path):
+            return
+
+        # Seek past the rows the sidecar index says are older than start_str
+        start_offset = None
+        if start_str:
+            try:
+                start_offset = find_start_offset(data_path, start_str)
+            except OSError:
+                start_offset = None  # index unusable, fall back to a full scan
+
+        yield from _iter_csv_rows(data_path, start_str, end_str, start_offset, as_records)
+
+def read_data_range(start_date=None, end_date=None, last_n_days=None, as_records=False):
+    """
+    Read weather data with optional filtering, list version of iter_data_range
+    
+    Args:
+        start_date: datetime object or string "YYYY-MM-DD HH:MM:SS"
+        end_date: datetime object or string "YYYY-MM-DD HH:MM:SS" 
+        last_n_days: int, get last N days of data
+        as_records: bool, return WeatherRecord objects instead of dicts of strings
         
     Returns:
-        list of dictionaries with weather data, or error message string
+        list of dictionaries (or WeatherRecords) with weather data, or error message string
     """
     try:
-        wkdirectory = os.getcwd()
-        data_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
-        
-        if not os.path.isfile(data_path):
+        if not _weather_data_exists():
             return "No weather data file found"
         
-        # Calculate date range if using last_n_days
-        if last_n_days:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=last_n_days)
-        
-        # Convert string dates to datetime objects if needed
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S")
-        if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
+        return list(iter_data_range(start_date, end_date, last_n_days, as_records))
         
-        # Read and filter data
-        filtered_data = []
-        with open(data_path, 'r') as f:
-            lines = f.readlines()
-            
-        # Skip header, process data lines
-        for line in lines[1:]:
+    except Exception as e:
+        return f"Error reading data: {str(e)}"
+
+# rollups
+# one line per bucket: the bucket key, then count,sum,min,max of the valid readings of each channel
+ROLLUP_KEY_LENGTH = {"hourly": 13, "daily": 10, "monthly": 7}  # prefix of the timestamp that names the bucket
+ROLLUP_HEADER = "bucket," + ",".join(f"{key}_{stat}" for key in DATA_KEYS[1:] for stat in ("count", "sum", "min", "max")) + "\n"
+
+def _rollup_path(resolution:str):
+    if resolution not in ROLLUP_FILES:
+        raise ValueError(f"unknown rollup resolution {resolution!r}, expected one of {', '.join(ROLLUP_FILES)}")
+    return os.path.join(os.getcwd(), ROLLUP_FILES[resolution])
+
+def _new_bucket():
+    """per channel [count, sum, min, max]"""
+    return [[0, 0.0, None, None] for key in DATA_KEYS[1:]]
+
+def _add_to_bucket(bucket, sensor_data:dict):
+    """fold one reading into a bucket, invalid readings are not counted"""
+    for stats, key in zip(bucket, DATA_KEYS[1:]):
+        value = float(sensor_data[key])
+        if value == INVALID_READING:
+            continue
+        stats[0] += 1
+        stats[1] += value
+        stats[2] = value if stats[2] is None else min(stats[2], value)
+        stats[3] = value if stats[3] is None else max(stats[3], value)
+
+def _format_bucket(bucket_key:str, bucket):
+    fields = [bucket_key]
+    for count, total, low, high in bucket:
+        fields += [str(count), str(total), "" if low is None else str(low), "" if high is None else str(high)]
+    return ",".join(fields) + "\n"
+
+def _parse_bucket(line:str, key_length:int):
+    """inverse of _format_bucket, returns (bucket_key, bucket)"""
+    fields = line.strip().split(',')
+    bucket = []
+    for i in range(1, len(fields), 4):
+        count, total, low, high = fields[i:i + 4]
+        bucket.append([int(count), float(total), float(low) if low else None, float(high) if high else None])
+    # the key must be a timestamp prefix of the resolution's length, a line that lost its start to a torn write fails here
+    if (len(bucket) != len(DATA_KEYS) - 1 or len(fields[0]) != key_length
+            or not is_timestamp(fields[0] + "0000-01-01 00:00:00"[key_length:])):
+        raise ValueError(f"malformed rollup line: {line.strip()}")
+    return fields[0], bucket
+
+def _last_rollup_line(f, block_size:int=4096):
+    """(offset, raw bytes with newline) of the last line after the header of an open rollup file, (None, b"") if there is none"""
+    f.seek(0)
+    header_length = len(f.readline())
+    position = f.seek(0, os.SEEK_END)
+    buffer = b""
+    while position > header_length:
+        read_size = min(block_size, position - header_length)
+        position -= read_size
+        f.seek(position)
+        buffer = f.read(read_size) + buffer
+        cut = buffer.rfind(b"\n", 0, len(buffer) - 1)
+        if cut != -1:
+            return position + cut + 1, buffer[cut + 1:]
+    if buffer:
+        return header_length, buffer
+    return None, b""
+
+def _update_rollup(resolution:str, sensor_data:dict):
+    """fold one reading into one rollup file"""
+    path = _rollup_path(resolution)
+    timestamp_str = sensor_data['timestamp']
+    bucket_key = timestamp_str[:ROLLUP_KEY_LENGTH[resolution]]
+
+    if not os.path.isfile(path):
+        bucket = _new_bucket()
+        _add_to_bucket(bucket, sensor_data)
+        with open(path, 'w') as f:
+            f.write(ROLLUP_HEADER)
+            f.write(_format_bucket(bucket_key, bucket))
+        return
+
+    with open(path, 'r+b') as f:
+        last_key, last_bucket = None, None
+        while True:
+            offset, line = _last_rollup_line(f)
+            if offset is None:
+                break
             try:
-                parts = line.strip().split(',')
-                timestamp_str = parts[0]
-                timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                
-                # Apply date filtering
-                if start_date and timestamp < start_date:
-                    continue
-                if end_date and timestamp > end_date:
-                    continue
-                
-                # Create data dictionary
-                data_dict = {
-                    'timestamp': timestamp_str,
-                    'exterior_temp': parts[1],
-                    'enclosure_temp': parts[2],
-                    'humidity': parts[3],
-                    'pressure': parts[4]
-                }
-                filtered_data.append(data_dict)
-                
-            except (ValueError, IndexError):
-                # Skip malformed lines
-                continue
+                if not line.endswith(b"\n"):
+                    raise ValueError("no newline")  # every write ends with one, the last field may be cut short
+                last_key, last_bucket = _parse_bucket(line.decode('ascii'), ROLLUP_KEY_LENGTH[resolution])
+                break
+            except (ValueError, UnicodeDecodeError):
+                # a write cut short by a power cut, whatever it held is missing until the rollups are rebuilt
+                f.truncate(offset)
+                log_error(f"Rollup: dropped a torn last line from the {resolution} rollup, run rebuild_rollups")
+
+        if last_key == bucket_key:
+            # same bucket, replace the last line. the new line is appended and synced before it is moved
+            # over the old one, so a cut at any point leaves a complete copy of the bucket as the last line
+            _add_to_bucket(last_bucket, sensor_data)
+            new_line = _format_bucket(bucket_key, last_bucket).encode()
+            f.seek(0, os.SEEK_END)
+            f.write(new_line)
+            f.flush()
+            os.fsync(f.fileno())
+            f.seek(offset)
+            f.write(new_line)
+            f.truncate(offset + len(new_line))
+        elif last_key is None or bucket_key > last_key:
+            bucket = _new_bucket()
+            _add_to_bucket(bucket, sensor_data)
+            f.seek(0, os.SEEK_END)
+            f.write(_format_bucket(bucket_key, bucket).encode())
+        else:
+            log_error(f"Rollup: reading at {timestamp_str} is older than {resolution} bucket {last_key}, run rebuild_rollups")
+
+def update_rollups(sensor_data:dict):
+    """
+    fold one reading into the hourly, daily and monthly rollup files.
+    only the last line of each file can change, so it is rewritten in place (O(1) per append).
+    each resolution is updated on its own, failures are logged and never fail the data write,
+    rebuild_rollups() regenerates everything from raw data
+    """
+    errors = []
+    for resolution in ROLLUP_KEY_LENGTH:
+        try:
+            _update_rollup(resolution, sensor_data)
+        except Exception as e:
+            error_msg = f"Rollup update failed ({resolution}): {str(e)}"
+            log_error(error_msg)
+            errors.append(error_msg)
+    return "; ".join(errors) if errors else "rollups updated"
+
+def rebuild_rollups():
+    """regenerate every rollup file from the raw data in one streaming pass"""
+    try:
+        writers = {}
+        current = {}
+        for resolution in ROLLUP_KEY_LENGTH:
+            tmp_path = _rollup_path(resolution) + ".tmp"
+            writers[resolution] = open(tmp_path, 'w')
+            writers[resolution].write(ROLLUP_HEADER)
+            current[resolution] = (None, None)
+
+        rows = 0
+        try:
+            for row in iter_data_range():
+                for resolution, key_length in ROLLUP_KEY_LENGTH.items():
+                    bucket_key = row['timestamp'][:key_length]
+                    last_key, bucket = current[resolution]
+                    if bucket_key != last_key:
+                        if last_key is not None:
+                            writers[resolution].write(_format_bucket(last_key, bucket))
+                        bucket = _new_bucket()
+                        current[resolution] = (bucket_key, bucket)
+                    try:
+                        _add_to_bucket(bucket, row)
+                    except ValueError:
+                        pass  # unparseable channel value
+                rows += 1
+
+            for resolution, (last_key, bucket) in current.items():
+                if last_key is not None:
+                    writers[resolution].write(_format_bucket(last_key, bucket))
+        finally:
+            for f in writers.values():
+                f.close()
+
+        for resolution in ROLLUP_KEY_LENGTH:
+            os.replace(_rollup_path(resolution) + ".tmp", _rollup_path(resolution))
+        return f"rollups rebuilt from {rows} records"
+    except Exception as e:
+        error_msg = f"Rollup rebuild failed: {str(e)}"
+        log_error(error_msg)
+        return error_msg
+
+def read_rollup(resolution:str, start_date=None, end_date=None):
+    """
+    Read summary statistics at "hourly", "daily" or "monthly" resolution
+    
+    Args:
+        resolution: "hourly", "daily" or "monthly"
+        start_date: datetime object or string "YYYY-MM-DD HH:MM:SS", first bucket is the one holding it
+        end_date: datetime object or string "YYYY-MM-DD HH:MM:SS", last bucket is the one holding it
         
-        return filtered_data
+    Returns:
+        list of dictionaries with 'bucket' and <channel>_count/_mean/_min/_max for each channel
+        (None when a bucket has no valid readings), or error message string
+    """
+    try:
+        path = _rollup_path(resolution)
+        if not os.path.isfile(path):
+            return "No rollup file found"
+
+        key_length = ROLLUP_KEY_LENGTH[resolution]
+        start_str, end_str = _range_bounds(start_date, end_date)
+        first_key = start_str[:key_length] if start_str else None
+        last_key = end_str[:key_length] if end_str else None
+
+        summaries = []
+        with open(path, 'r') as f:
+            f.readline()  # skip header
+            for line in f:
+                try:
+                    bucket_key, bucket = _parse_bucket(line, key_length)
+                except ValueError:
+                    continue  # Skip malformed lines
+                if first_key and bucket_key < first_key:
+                    continue
+                if last_key and bucket_key > last_key:
+                    break
+                if summaries and summaries[-1]['bucket'] == bucket_key:
+                    summaries.pop()  # an interrupted update can leave an older copy of the bucket before it
+
+                summary = {'bucket': bucket_key}
+                for key, (count, total, low, high) in zip(DATA_KEYS[1:], bucket):
+                    summary[f"{key}_count"] = count
+                    summary[f"{key}_mean"] = total / count if count else None
+                    summary[f"{key}_min"] = low
+                    summary[f"{key}_max"] = high
+                summaries.append(summary)
+        return summaries
+
+    except Exception as e:
+        return f"Error reading rollup: {str(e)}"
+
+# numpy columnar loader
+ARRAY_DTYPE = [('timestamp', '<i8'), ('exterior_temp', '<f8'), ('enclosure_temp', '<f8'), ('humidity', '<f8'), ('pressure', '<f8')]
+
+def _parse_csv_block(np, lines):
+    """
+    parse a list of csv data lines into (epochs, values) arrays with vectorized numpy calls.
+    epochs are int64 seconds (station time encoded as UTC, like timestamp_to_epoch), values an (n, 4) float64 array
+    """
+    try:
+        epochs = np.array(lines).astype('U19').astype('datetime64[s]').astype(np.int64)
+        values = np.loadtxt(lines, delimiter=',', usecols=(1, 2, 3, 4), dtype=np.float64, ndmin=2)
+    except ValueError:
+        # malformed rows (torn writes, hand edits) break the vectorized parse, drop them and retry once
+        lines = [line for line in lines if is_timestamp(line[:19]) and len(line.split(',')) >= 5]
+        if not lines:
+            return np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float64)
+        epochs = np.array(lines).astype('U19').astype('datetime64[s]').astype(np.int64)
+        values = np.loadtxt(lines, delimiter=',', usecols=(1, 2, 3, 4), dtype=np.float64, ndmin=2)
+    return epochs, values.reshape(-1, 4)
+
+def _read_csv_block(data_path:str, start_offset=None, end_offset=None):
+    """data lines of a csv file between two byte offsets (header skipped when starting from the top)"""
+    with open(data_path, 'r') as f:
+        if start_offset is None:
+            f.readline()  # skip header
+        else:
+            f.seek(start_offset)
+        text = f.read() if end_offset is None else f.read(end_offset - f.tell())
+    return [line for line in text.split("\n") if line]
+
+def load_range_arrays(start_date=None, end_date=None, last_n_days=None):
+    """
+    Load weather data as numpy column arrays for analysis and plotting
+    
+    Args:
+        start_date: datetime object or string "YYYY-MM-DD HH:MM:SS"
+        end_date: datetime object or string "YYYY-MM-DD HH:MM:SS" 
+        last_n_days: int, get last N days of data
         
+    Returns:
+        dict of arrays keyed like read_data_range ('timestamp' int64 epoch seconds,
+        channels float64 with NaN for INVALID_READING), or error message string
+    """
+    try:
+        import numpy as np  # only the analysis path pays for the numpy import
+    except ImportError:
+        return "Error loading arrays: numpy not installed"
+
+    try:
+        if not _weather_data_exists():
+            return "No weather data file found"
+
+        start_str, end_str = _range_bounds(start_date, end_date, last_n_days)
+        start_epoch = timestamp_to_epoch(start_str) if start_str else None
+        end_epoch = timestamp_to_epoch(end_str) if end_str else None
+        wkdirectory = os.getcwd()
+
+        if DATA_BACKEND == "binary":
+            # the record file already is a structured array, map it and slice by binary search
+            bin_path = os.path.join(wkdirectory, WEATHER_BINARY_FILE)
+            n_records = os.path.getsize(bin_path) // RECORD_SIZE
+            if n_records == 0:
+                records = np.empty(0, dtype=ARRAY_DTYPE)
+            else:
+                mapped = np.memmap(bin_path, dtype=ARRAY_DTYPE, mode='r', shape=(n_records,))
+                first = 0 if start_epoch is None else np.searchsorted(mapped['timestamp'], start_epoch, side='left')
+                last = n_records if end_epoch is None else np.searchsorted(mapped['timestamp'], end_epoch, side='right')
+                records = np.array(mapped[first:last])
+                del mapped
+            epochs = records['timestamp']
+            values = np.column_stack([records[key] for key in DATA_KEYS[1:]]) if len(records) else np.empty((0, 4))
+        else:
+            if DATA_BACKEND == "partitioned":
+                first_month = start_str[:7] if start_str else None
+                last_month = end_str[:7] if end_str else None
+                lines = []
+                for month, partition_path in list_partitions():
+                    if first_month and month < first_month:
+                        continue
+                    if last_month and month > last_month:
+                        break
+                    lines.extend(_read_csv_block(partition_path))
+            else:
+                # the sparse index narrows the read to the byte range holding the query
+                data_path = os.path.join(wkdirectory, WEATHER_DATA_FILE)
+                start_offset = find_start_offset(data_path, start_str) if start_str else None
+                end_offset = find_end_offset(data_path, end_str) if end_str else None
+                lines = _read_csv_block(data_path, start_offset, end_offset)
+
+            if lines:
+                epochs, values = _parse_csv_block(np, lines)
+            else:
+                epochs, values = np.empty(0, dtype=np.int64), np.empty((0, 4), dtype=np.float64)
+
+            mask = np.ones(len(epochs), dtype=bool)
+            if start_epoch is not None:
+                mask &= epochs >= start_epoch
+            if end_epoch is not None:
+                mask &= epochs <= end_epoch
+            epochs, values = epochs[mask], values[mask]
+
+        values = values.astype(np.float64)
+        values[values == INVALID_READING] = np.nan
+
+        columns = {'timestamp': epochs.astype(np.int64)}
+        for i, key in enumerate(DATA_KEYS[1:]):
+            columns[key] = np.ascontiguousarray(values[:, i])
+        return columns
+
     except Exception as e:
-        return f"Error reading data: {str(e)}"
+        return f"Error loading arrays: {str(e)}"
+
+# raw capture ring buffer
+# a fixed header (magic, capacity in frames, next slot to write, frames stored) followed by `capacity` frame slots.
+# once full, new frames overwrite the oldest so the file never grows past RAW_CAPTURE_MAX_BYTES
+RAW_CAPTURE_MAGIC = b"WGRC"
+RAW_HEADER_FORMAT = '<4sIII'
+RAW_HEADER_SIZE = struct.calcsize(RAW_HEADER_FORMAT)  # 16 bytes
+# window epoch (int64), monotonic seconds (float64), SHT30 temperature/humidity words (uint16),
+# BMP388 adc_p/adc_t (uint32), flags: bit 0 SHT30 words valid, bit 1 BMP388 counts valid
+RAW_FRAME_FORMAT = '<qdHHIIB'
+RAW_FRAME_SIZE = struct.calcsize(RAW_FRAME_FORMAT)  # 29 bytes
+RAW_SHT30_VALID = 0x01
+RAW_BMP388_VALID = 0x02
+
+def _pack_raw_frame(window_epoch:int, sample):
+    """pack one (monotonic, sht30 raw or None, bmp388 raw or None) sample"""
+    monotonic, sht30_raw, bmp388_raw = sample
+    flags = 0
+    if sht30_raw is not None:
+        flags |= RAW_SHT30_VALID
+    if bmp388_raw is not None:
+        flags |= RAW_BMP388_VALID
+    temp_raw, humidity_raw = sht30_raw or (0, 0)
+    adc_p, adc_t = bmp388_raw or (0, 0)
+    return struct.pack(RAW_FRAME_FORMAT, window_epoch, monotonic, temp_raw, humidity_raw, adc_p, adc_t, flags)
+
+def append_raw_frames(timestamp_str:str, samples, path=None, max_bytes=RAW_CAPTURE_MAX_BYTES):
+    """
+    append the raw samples of one averaging window (labelled with its timestamp) to the ring buffer file.
+    one buffered write per contiguous run of slots plus a header update, no fsync
+    """
+    if path is None:
+        path = os.path.join(os.getcwd(), RAW_CAPTURE_FILE)
+    capacity = (max_bytes - RAW_HEADER_SIZE) // RAW_FRAME_SIZE
+    if capacity <= 0 or not samples:
+        return "no raw frames written"
+
+    window_epoch = timestamp_to_epoch(timestamp_str)
+    frames = b"".join(_pack_raw_frame(window_epoch, sample) for sample in samples[-capacity:])
+    n_frames = len(frames) // RAW_FRAME_SIZE
+
+    try:
+        f = open(path, 'r+b')
+    except FileNotFoundError:
+        f = open(path, 'w+b')
+
+    with f:
+        head = count = 0
+        header = f.read(RAW_HEADER_SIZE)
+        if len(header) == RAW_HEADER_SIZE:
+            magic, stored_capacity, head, count = struct.unpack(RAW_HEADER_FORMAT, header)
+            if magic != RAW_CAPTURE_MAGIC or stored_capacity != capacity:
+                # foreign file or a new size limit, start the buffer over
+                f.truncate(0)
+                head = count = 0
+
+        # first run from head to the end of the slots, then wrap to slot 0
+        first = min(n_frames, capacity - head)
+        f.seek(RAW_HEADER_SIZE + head * RAW_FRAME_SIZE)
+        f.write(frames[:first * RAW_FRAME_SIZE])
+        if first < n_frames:
+            f.seek(RAW_HEADER_SIZE)
+            f.write(frames[first * RAW_FRAME_SIZE:])
+        head = (head + n_frames) % capacity
+        count = min(count + n_frames, capacity)
+        f.seek(0)
+        f.write(struct.pack(RAW_HEADER_FORMAT, RAW_CAPTURE_MAGIC, capacity, head, count))
+    return f"{n_frames} raw frames written"
+
+def iter_raw_frames(path=None):
+    """
+    yield the frames in the ring buffer oldest first as
+    (timestamp_str, monotonic, sht30 (temp_raw, humidity_raw) or None, bmp388 (adc_p, adc_t) or None)
+    """
+    if path is None:
+        path = os.path.join(os.getcwd(), RAW_CAPTURE_FILE)
+    with open(path, 'rb') as f:
+        magic, capacity, head, count = struct.unpack(RAW_HEADER_FORMAT, f.read(RAW_HEADER_SIZE))
+        if magic != RAW_CAPTURE_MAGIC:
+            raise ValueError(f"{path} is not a raw capture file")
+        body = f.read(capacity * RAW_FRAME_SIZE)
+
+    first = head if count == capacity else 0
+    for i in range(count):
+        slot = (first + i) % capacity
+        window_epoch, monotonic, temp_raw, humidity_raw, adc_p, adc_t, flags = struct.unpack_from(
+            RAW_FRAME_FORMAT, body, slot * RAW_FRAME_SIZE)
+        yield (epoch_to_timestamp(window_epoch), monotonic,
+               (temp_raw, humidity_raw) if flags & RAW_SHT30_VALID else None,
+               (adc_p, adc_t) if flags & RAW_BMP388_VALID else None)
+
+def iter_error_logs(start_date=None, end_date=None, last_n_days=None):
+    """
+    Generator version of read_error_logs: yields one dict per error and stops at the first
+    error past end_date. yields nothing if there is no error log
+    
+    Args:
+        start_date: datetime object or string "YYYY-MM-DD HH:MM:SS"
+        end_date: datetime object or string "YYYY-MM-DD HH:MM:SS" 
+        last_n_days: int, get last N days of errors
+    """
+    error_path = os.path.join(os.getcwd(), ERROR_LOG_FILE)
+    if not os.path.isfile(error_path):
+        return
+
+    # Work out the range once as timestamp strings
+    start_str, end_str = _range_bounds(start_date, end_date, last_n_days)
+
+    with open(error_path, 'r') as f:
+        f.readline()  # skip header
+        for line in f:
+            # Split on first comma only (error messages might contain commas)
+            parts = line.strip().split(',', 1)
+            if len(parts) < 2 or not is_timestamp(parts[0]):
+                # Skip malformed lines
+                continue
+            timestamp_str, error_message = parts
+            
+            # Apply date filtering, errors are logged in time order
+            if start_str and timestamp_str < start_str:
+                continue
+            if end_str and timestamp_str > end_str:
+                return
+            
+            # Create error dictionary
+            yield {
+                'timestamp': timestamp_str,
+                'error_message': error_message
+            }
 
 def read_error_logs(start_date=None, end_date=None, last_n_days=None):
     """
-    Read error log data with optional filtering
+    Read error log data with optional filtering, list version of iter_error_logs
     
     Args:
         start_date: datetime object or string "YYYY-MM-DD HH:MM:SS"
@@ -254,48 +1430,82 @@ def read_error_logs(start_date=None, end_date=None, last_n_days=None):
         if not os.path.isfile(error_path):
             return "No error log file found"
         
-        # Calculate date range if using last_n_days
-        if last_n_days:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=last_n_days)
-        
-        # Convert string dates to datetime objects if needed
-        if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, "%Y-%m-%d %H:%M:%S")
-        if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, "%Y-%m-%d %H:%M:%S")
-        
-        # Read and filter error data
-        filtered_errors = []
-        with open(error_path, 'r') as f:
-            lines = f.readlines()
-            
-        # Skip header, process error lines
-        for line in lines[1:]:
-            try:
-                # Split on first comma only (error messages might contain commas)
-                timestamp_str, error_message = line.strip().split(',', 1)
-                timestamp = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-                
-                # Apply date filtering
-                if start_date and timestamp < start_date:
-                    continue
-                if end_date and timestamp > end_date:
-                    continue
-                
-                # Create error dictionary
-                error_dict = {
-                    'timestamp': timestamp_str,
-                    'error_message': error_message
-                }
-                filtered_errors.append(error_dict)
-                
-            except (ValueError, IndexError):
-                # Skip malformed lines
-                continue
-        
-        return filtered_errors
+        return list(iter_error_logs(start_date, end_date, last_n_days))
         
     except Exception as e:
         return f"Error reading error logs: {str(e)}"
-    
\ No newline at end of file
+
+# byte offset reading, for the upload cursor
+def file_identity(path:str):
+    """(inode, header + first data line) of a log file, changes when it is replaced, rotated or compacted"""
+    with open(path, 'rb') as f:
+        head = f.readline() + f.readline()
+        return os.fstat(f.fileno()).st_ino, head.decode('utf-8', 'replace')
+
+def complete_offset(path:str, block_size:int=4096):
+    """offset just past the last complete line, a torn final write is left for next time"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                return start + newline + 1
+            position = start
+        return 0
+
+def iter_lines_between(path:str, start_offset:int, end_offset:int, consumed=None, block_size:int=64 * 1024):
+    """
+    yield the complete lines between two byte offsets, reading in blocks.
+    consumed['offset'] follows the end of the last line yielded, the place to resume from
+    """
+    if consumed is None:
+        consumed = {}
+    consumed['offset'] = start_offset
+    with open(path, 'rb') as f:
+        f.seek(start_offset)
+        position = start_offset
+        partial = b""
+        while position < end_offset:
+            block = f.read(min(block_size, end_offset - position))
+            if not block:
+                break
+            position += len(block)
+            lines = (partial + block).split(b"\n")
+            partial = lines.pop()
+            for line in lines:
+                consumed['offset'] += len(line) + 1
+                yield line.decode('utf-8', 'replace')
+
+def iter_data_from_offset(data_path:str, start_offset:int, end_offset:int, consumed=None):
+    """data rows (dicts of strings, like iter_data_range) stored between two byte offsets of a csv data file"""
+    for line in iter_lines_between(data_path, start_offset, end_offset, consumed):
+        parts = line.strip().split(',')
+        if len(parts) >= 5 and is_timestamp(parts[0]):
+            yield dict(zip(DATA_KEYS, parts[:5]))
+
+def iter_errors_from_offset(error_path:str, start_offset:int, end_offset:int, consumed=None):
+    """error dicts (like iter_error_logs) stored between two byte offsets of the error log"""
+    for line in iter_lines_between(error_path, start_offset, end_offset, consumed):
+        parts = line.strip().split(',', 1)
+        if len(parts) == 2 and is_timestamp(parts[0]):
+            yield {
+                'timestamp': parts[0],
+                'error_message': parts[1]
+            }
+
+if __name__ == "__main__":
+    # maintenance commands: python database.py <command>
+    import sys
+    commands = {
+        'convert-binary': convert_csv_to_binary,
+        'migrate-partitions': migrate_to_partitions,
+        'rebuild-index': lambda: f"index rebuilt with {len(rebuild_index(os.path.join(os.getcwd(), WEATHER_DATA_FILE)))} entries",
+        'rebuild-rollups': rebuild_rollups,
+    }
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print(f"usage: python database.py {{{'|'.join(commands)}}}")
+        sys.exit(1)
+    print(commands[sys.argv[1]]())
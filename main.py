@@ -1,21 +1,20 @@
 import time
-import signal
-import sys
-import gpiozero
 from datetime import datetime, timedelta
 #from display import initialize_display, update_display
-from sensors import *
-from database import *
-from web_server import *
-from config import *
+from sensors import initialize_sensors, read_sensors_over_interval, sensors_reusable
+from database import log_error, update_datalog
+from upload_schedule import should_upload
+from config import DEVELOPMENT_MODE, WITTY_PI_SLEEP, AVERAGING_PERIOD, READING_INTERVAL, MAIN_LOOP_INTERVAL, SHUTDOWN_SIGNAL_PIN
 
-if not DEVELOPMENT_MODE:
-    import RPi.GPIO as GPIO
+# every cycle may be a fresh interpreter (Witty Pi, regular_loop.sh), so modules only some cycles need
+# (web_server and requests for the daily upload, RPi.GPIO for shutdown) are imported where they are used.
+# the upload schedule check itself only reads small state files and lives in upload_schedule
 
 def signal_early_shutdown():
     """Signal Witty Pi for early shutdown (production only)"""
     if not DEVELOPMENT_MODE:
         try:
+            import RPi.GPIO as GPIO
             GPIO.setmode(GPIO.BCM)
             GPIO.setup(SHUTDOWN_SIGNAL_PIN, GPIO.OUT)
             GPIO.output(SHUTDOWN_SIGNAL_PIN, GPIO.HIGH)  # Start high
@@ -60,12 +59,16 @@ def save_last_cleanup_time(timestamp):
     except Exception as e:
         log_error(f"Failed to save last cleanup time")
 
-def take_readings():
-    """Core weather station functionality"""
+def take_readings(sensors=None):
+    """
+    Core weather station functionality
+    pass the sensors from an earlier initialize_sensors() to reuse them, otherwise they are initialized here
+    """
     try:
         # Initialize sensors
-        print("Initializing sensors...")
-        sensors = initialize_sensors()
+        if sensors is None:
+            print("Initializing sensors...")
+            sensors = initialize_sensors()
         
         if not sensors:
             error_msg = "Failed to initialize sensors"
@@ -90,6 +93,7 @@ def take_readings():
             
             # Check for upload
             if should_upload():
+                from web_server import upload_to_server, should_update, close_session
                 print("Upload needed - connecting to network...")
                 upload_result = upload_to_server()
                 print(f"Upload result: {upload_result}")
@@ -98,6 +102,7 @@ def take_readings():
                 print("Checking for update flag")
                 update_result = should_update()
                 print(f"Software update result: {update_result}")
+                print(f"Network: {close_session()}")
             else:
                 print("No upload needed")
                 
@@ -178,6 +183,7 @@ def main_loop():
     print("=" * 50)
     
     cycle_count = 0
+    sensors = None  # initialized on the first cycle and kept open while they keep producing real readings
     
     while True:
         start_time = datetime.now()
@@ -187,7 +193,12 @@ def main_loop():
             print(f"\n--- Cycle {cycle_count} at {datetime.now().strftime('%H:%M:%S')} ---")
             
             # Take readings
-            sensor_data = take_readings()
+            if sensors is None:
+                print("Initializing sensors...")
+                sensors = initialize_sensors()
+            sensor_data = take_readings(sensors)
+            if not sensors_reusable(sensors, sensor_data):
+                sensors = None  # mock fallback or no valid readings, retry the hardware next cycle
             
             if sensor_data:
                 print(f"Cycle {cycle_count} completed successfully")
@@ -208,12 +219,16 @@ def main_loop():
             error_msg = f"Error in main loop cycle {cycle_count}: {str(e)}"
             print(error_msg)
             log_error(error_msg)
+            sensors = None  # start the next cycle with fresh sensor handles
             print("Waiting 60 seconds before retry...")
             time.sleep(60)
 
 def cleanup_gpio():
     """Clean up GPIO on exit"""
+    if DEVELOPMENT_MODE:
+        return
     try:
+        import RPi.GPIO as GPIO
         GPIO.cleanup()
     except:
         pass
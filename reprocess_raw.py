@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Recompute window averages from the raw capture ring buffer (RAW_CAPTURE), no hardware needed.
+Converts the stored SHT30 words and BMP388 counts again, optionally with a different filter
+or BMP388 calibration, and prints one weather_data.csv style line per window
+
+usage: python reprocess_raw.py [--file raw_capture.bin] [--calibration bmp388_calibration.json] [--filter mean|median|sigma]
+"""
+
+import sys
+import json
+import argparse
+import statistics
+from itertools import groupby
+
+from config import RAW_CAPTURE_FILE, BMP388_CALIBRATION_CACHE, INVALID_READING
+from database import DATA_KEYS, iter_raw_frames
+from sensors import SHT30, BMP388
+
+
+def filter_mean(values):
+    """plain mean, what the station logs"""
+    return sum(values) / len(values)
+
+
+def filter_median(values):
+    return statistics.median(values)
+
+
+def filter_sigma(values, limit=3.0):
+    """mean after dropping values more than `limit` standard deviations from the mean"""
+    if len(values) < 3:
+        return filter_mean(values)
+    mean = statistics.fmean(values)
+    spread = statistics.stdev(values)
+    kept = [value for value in values if abs(value - mean) <= limit * spread] or values
+    return filter_mean(kept)
+
+
+FILTERS = {'mean': filter_mean, 'median': filter_median, 'sigma': filter_sigma}
+
+
+def compensate(bmp388, bmp_raw):
+    """compensate the (adc_p, adc_t) pairs, batched when numpy is available"""
+    if not bmp_raw:
+        return [], []
+    adc_p, adc_t = zip(*bmp_raw)
+    try:
+        temperatures, pressures = bmp388.compensate_batch(adc_p, adc_t)
+        return temperatures.tolist(), pressures.tolist()
+    except ImportError:
+        pairs = [bmp388._compensate(p, t) for p, t in bmp_raw]
+        return [t for t, p in pairs], [p for t, p in pairs]
+
+
+def reprocess(capture_path, bmp388, reduce):
+    """yield one recomputed reading dict per window in the capture file"""
+    for timestamp, frames in groupby(iter_raw_frames(capture_path), key=lambda frame: frame[0]):
+        frames = list(frames)
+        sht_values = [SHT30.convert_raw(*frame[2]) for frame in frames if frame[2] is not None]
+        enclosure_temps, pressures = compensate(bmp388, [frame[3] for frame in frames if frame[3] is not None])
+        channels = {
+            'exterior_temp': [temperature for temperature, humidity in sht_values],
+            'enclosure_temp': enclosure_temps,
+            'humidity': [humidity for temperature, humidity in sht_values],
+            'pressure': pressures,
+        }
+        reading = {'timestamp': timestamp}
+        for key, values in channels.items():
+            reading[key] = reduce(values) if values else INVALID_READING
+        yield reading
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute window averages from the raw capture file")
+    parser.add_argument('--file', default=RAW_CAPTURE_FILE, help="raw capture ring buffer")
+    parser.add_argument('--calibration', default=BMP388_CALIBRATION_CACHE,
+                        help="BMP388 calibration cache (json with a 'coefficients' map)")
+    parser.add_argument('--filter', choices=sorted(FILTERS), default='mean', help="how each window is reduced")
+    args = parser.parse_args()
+
+    try:
+        with open(args.calibration, 'r') as f:
+            bmp388 = BMP388.offline(json.load(f)['coefficients'])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Cannot load BMP388 calibration from {args.calibration}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sys.stdout.write(",".join(DATA_KEYS) + "\n")
+    for reading in reprocess(args.file, bmp388, FILTERS[args.filter]):
+        sys.stdout.write(",".join(str(reading[key]) for key in DATA_KEYS) + "\n")
+
+
+if __name__ == "__main__":
+    main()
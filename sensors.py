@@ -1,44 +1,148 @@
+import os
+import json
 import time
 from datetime import datetime
-from config import AVERAGING_PERIOD, READING_INTERVAL, INVALID_READING
+from config import BMP388_CALIBRATION_CACHE, AVERAGING_PERIOD, READING_INTERVAL, INVALID_READING, SHT30_MODE, SHT30_REPEATABILITY, SHT30_MPS, BMP388_FIFO, BMP388_FIFO_ODR, STREAM_MEDIAN, ADAPTIVE_AVERAGING, ADAPTIVE_MIN_PERIOD, ADAPTIVE_TOLERANCE, RAW_CAPTURE
+from database import append_raw_frames
 
 # Try to import smbus2 for hardware sensors
 try:
-    from smbus2 import SMBus
+    from smbus2 import SMBus, i2c_msg
     HARDWARE_AVAILABLE = True
 except ImportError:
     HARDWARE_AVAILABLE = False
     print("smbus2 not available, using mock sensors")
 
+# one SMBus handle per bus number, shared by every sensor on that bus and kept open for the life of the process
+_BUSES = {}
+
+def open_bus(bus):
+    """SMBus handle for bus number `bus`, opened on first use"""
+    if bus not in _BUSES:
+        _BUSES[bus] = SMBus(bus)
+    return _BUSES[bus]
+
 class SHT30:
     """SHT30 Temperature and Humidity Sensor"""
-    def __init__(self, bus=1, address=0x44):
-        self.bus = SMBus(bus)
+    # single shot commands with clock stretching, by repeatability
+    SINGLE_SHOT_COMMANDS = {'high': (0x2C, 0x06), 'medium': (0x2C, 0x0D), 'low': (0x2C, 0x10)}
+    # maximum conversion time in seconds (datasheet table 4), replaces a fixed 0.5 s wait
+    CONVERSION_TIMES = {'high': 0.0155, 'medium': 0.0065, 'low': 0.0045}
+    # periodic data acquisition commands, by measurements per second and repeatability
+    PERIODIC_COMMANDS = {
+        0.5: {'high': (0x20, 0x32), 'medium': (0x20, 0x24), 'low': (0x20, 0x2F)},
+        1: {'high': (0x21, 0x30), 'medium': (0x21, 0x26), 'low': (0x21, 0x2D)},
+        2: {'high': (0x22, 0x36), 'medium': (0x22, 0x20), 'low': (0x22, 0x2B)},
+        4: {'high': (0x23, 0x34), 'medium': (0x23, 0x22), 'low': (0x23, 0x29)},
+        10: {'high': (0x27, 0x37), 'medium': (0x27, 0x21), 'low': (0x27, 0x2A)},
+    }
+    FETCH_DATA_COMMAND = (0xE0, 0x00)
+    BREAK_COMMAND = (0x30, 0x93)
+    READ_STATUS_COMMAND = (0xF3, 0x2D)
+
+    def __init__(self, bus=1, address=0x44, repeatability=SHT30_REPEATABILITY):
+        self.bus = open_bus(bus)
+        self.bus_number = bus
         self.address = address
+        self.repeatability = repeatability
+        self.periodic = False
         self._temperature = None
         self._humidity = None
-        self._read_data()
+        self.raw = None  # (temperature word, humidity word) behind the last reading, None if it failed
+        self.read_status()  # presence check, raises if nothing answers at address
     
-    def _read_data(self):
-        """Read temperature and humidity from SHT30"""
+    def read_status(self):
+        """Read the 16 bit status register, no conversion involved"""
+        msb, lsb = self.READ_STATUS_COMMAND
+        self.bus.write_i2c_block_data(self.address, msb, [lsb])
+        data = self.bus.read_i2c_block_data(self.address, 0x00, 3)
+        return data[0] << 8 | data[1]
+    
+    @staticmethod
+    def convert_raw(temp_raw, humidity_raw):
+        """Convert the raw 16 bit words to (temperature in Celsius, relative humidity in %)"""
+        return -45 + (175 * temp_raw / 65535.0), 100 * humidity_raw / 65535.0
+    
+    def _convert(self, data):
+        """Convert a 6 byte result (temp msb, lsb, crc, humidity msb, lsb, crc)"""
+        temp_raw = data[0] * 256 + data[1]
+        humidity_raw = data[3] * 256 + data[4]
+        
+        self.raw = (temp_raw, humidity_raw)
+        self._temperature, self._humidity = self.convert_raw(temp_raw, humidity_raw)
+    
+    def trigger(self):
+        """Start a single shot conversion, return the seconds to wait before collect() (0 in periodic mode)"""
+        if self.periodic:
+            return 0
+        msb, lsb = self.SINGLE_SHOT_COMMANDS[self.repeatability]
+        self.bus.write_i2c_block_data(self.address, msb, [lsb])
+        return self.CONVERSION_TIMES[self.repeatability]
+    
+    def collect(self):
+        """Read the conversion started by trigger() (the latest result in periodic mode), return (temperature, humidity)"""
+        if self.periodic:
+            return self.fetch()
         try:
-            # Send measurement command (high repeatability)
-            self.bus.write_i2c_block_data(self.address, 0x2C, [0x06])
-            time.sleep(0.5)
-            
             # Read 6 bytes of data
             data = self.bus.read_i2c_block_data(self.address, 0x00, 6)
-            
-            # Convert to temperature and humidity
-            temp_raw = data[0] * 256 + data[1]
-            humidity_raw = data[3] * 256 + data[4]
-            
-            self._temperature = -45 + (175 * temp_raw / 65535.0)
-            self._humidity = 100 * humidity_raw / 65535.0
+            self._convert(data)
+        except Exception as e:
+            print(f"SHT30 read error: {e}")
+            self._temperature = INVALID_READING
+            self._humidity = INVALID_READING
+            self.raw = None
+        return self._temperature, self._humidity
+    
+    def _read_data(self):
+        """Read temperature and humidity from SHT30, fetching the latest result when in periodic mode"""
+        try:
+            # Send single shot measurement command and wait out the conversion
+            time.sleep(self.trigger())
         except Exception as e:
             print(f"SHT30 read error: {e}")
             self._temperature = INVALID_READING
             self._humidity = INVALID_READING
+            self.raw = None
+            return
+        self.collect()
+
+    def start_periodic(self, mps=SHT30_MPS):
+        """Start periodic data acquisition at `mps` measurements per second, returns the measurement period"""
+        msb, lsb = self.PERIODIC_COMMANDS[mps][self.repeatability]
+        self.bus.write_i2c_block_data(self.address, msb, [lsb])
+        self.periodic = True
+        return 1.0 / mps
+
+    def fetch(self):
+        """Fetch the latest periodic result, the sensor NACKs if no new measurement is ready"""
+        try:
+            msb, lsb = self.FETCH_DATA_COMMAND
+            self.bus.write_i2c_block_data(self.address, msb, [lsb])
+            read = i2c_msg.read(self.address, 6)
+            self.bus.i2c_rdwr(read)
+            self._convert(list(read))
+        except Exception as e:
+            print(f"SHT30 fetch error: {e}")
+            self._temperature = INVALID_READING
+            self._humidity = INVALID_READING
+            self.raw = None
+        return self._temperature, self._humidity
+
+    def stop_periodic(self):
+        """Stop periodic acquisition and return to single shot mode"""
+        try:
+            msb, lsb = self.BREAK_COMMAND
+            self.bus.write_i2c_block_data(self.address, msb, [lsb])
+            time.sleep(0.001)  # break takes up to 1 ms
+        except Exception as e:
+            print(f"SHT30 break error: {e}")
+        self.periodic = False
+    
+    def measure(self):
+        """Take one measurement, return (temperature in Celsius, relative humidity in %)"""
+        self._read_data()
+        return self._temperature, self._humidity
     
     @property
     def temperature(self):
@@ -54,52 +158,181 @@ class SHT30:
 
 class BMP388:
     """BMP388 Pressure and Temperature Sensor"""
-    def __init__(self, bus=1, address=0x77):
-        self.bus = SMBus(bus)
+    # FIFO registers and frame headers (datasheet sections 3.6 and 5)
+    FIFO_LENGTH_REGISTER = 0x12
+    FIFO_DATA_REGISTER = 0x14
+    FIFO_CONFIG_1_REGISTER = 0x17
+    FIFO_CONFIG_2_REGISTER = 0x18
+    ODR_REGISTER = 0x1D
+    CMD_REGISTER = 0x7E
+    FIFO_FLUSH = 0xB0
+    FIFO_SIZE = 512
+    FRAME_TEMP_PRESS = 0x94      # header + 3 bytes temperature + 3 bytes pressure
+    FRAME_TEMP = 0x90
+    FRAME_PRESS = 0x84
+    FRAME_SENSOR_TIME = 0xA0
+    FRAME_CONFIG_ERROR = 0x44
+    FRAME_CONFIG_CHANGE = 0x48
+    FRAME_EMPTY = 0x80
+    CHIP_ID_REGISTER = 0x00
+    CHIP_ID = 0x50
+    STATUS_REGISTER = 0x03
+    DATA_READY = 0x60            # drdy_press | drdy_temp
+    CALIBRATION_FIELDS = ('T1', 'T2', 'T3', 'P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8', 'P9', 'P10', 'P11')
+
+    def __init__(self, bus=1, address=0x77, cache_path=BMP388_CALIBRATION_CACHE):
+        self.bus = open_bus(bus)
+        self.bus_number = bus
         self.address = address
         self._temperature = None
         self._pressure = None
-        self._read_calibration()
+        self.raw = None  # (adc_p, adc_t) behind the last register reading, None if it failed
+        self.fifo_raw = []  # (adc_p, adc_t) pairs of the last FIFO drain
+        self._load_calibration(cache_path)
         self._configure()
     
+    def _load_calibration(self, cache_path):
+        """
+        Use the parsed coefficients from cache_path when it was written for this chip id, bus and address,
+        otherwise read them from the chip and write the cache. the chip id read doubles as a presence check.
+        the chip id is per part type, not per device: delete the cache file after swapping the sensor
+        """
+        chip_id = self.bus.read_byte_data(self.address, self.CHIP_ID_REGISTER)
+        key = {'chip_id': chip_id, 'bus': self.bus_number, 'address': self.address}
+        if cache_path:
+            try:
+                with open(cache_path, 'r') as f:
+                    cached = json.load(f)
+                if all(cached.get(name) == value for name, value in key.items()):
+                    for field in self.CALIBRATION_FIELDS:
+                        setattr(self, field, float(cached['coefficients'][field]))
+                    return
+            except (OSError, ValueError, KeyError, TypeError):
+                pass  # missing or unreadable cache, fall through to the chip
+
+        self._read_calibration()
+        if cache_path:
+            try:
+                key['coefficients'] = {field: getattr(self, field) for field in self.CALIBRATION_FIELDS}
+                temp_path = f"{cache_path}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(key, f)
+                os.replace(temp_path, cache_path)
+            except OSError as e:
+                print(f"BMP388 calibration cache write failed: {e}")
+    
     def _read_calibration(self):
         """Read calibration coefficients"""
-        import struct
         try:
             # Read calibration data from registers 0x31-0x45
-            cal_data = self.bus.read_i2c_block_data(self.address, 0x31, 21)
-            
-            # Parse calibration coefficients
-            self.T1 = struct.unpack('<H', bytes(cal_data[0:2]))[0] / 0.00390625
-            self.T2 = struct.unpack('<H', bytes(cal_data[2:4]))[0] / 1073741824.0
-            self.T3 = struct.unpack('b', bytes([cal_data[4]]))[0] / 281474976710656.0
-            
-            self.P1 = (struct.unpack('<h', bytes(cal_data[5:7]))[0] - 16384) / 1048576.0
-            self.P2 = (struct.unpack('<h', bytes(cal_data[7:9]))[0] - 16384) / 536870912.0
-            self.P3 = struct.unpack('b', bytes([cal_data[9]]))[0] / 4294967296.0
-            self.P4 = struct.unpack('b', bytes([cal_data[10]]))[0] / 137438953472.0
-            self.P5 = struct.unpack('<H', bytes(cal_data[11:13]))[0] / 0.125
-            self.P6 = struct.unpack('<H', bytes(cal_data[13:15]))[0] / 64.0
-            self.P7 = struct.unpack('b', bytes([cal_data[15]]))[0] / 256.0
-            self.P8 = struct.unpack('b', bytes([cal_data[16]]))[0] / 32768.0
-            self.P9 = struct.unpack('<h', bytes(cal_data[17:19]))[0] / 281474976710656.0
-            self.P10 = struct.unpack('b', bytes([cal_data[19]]))[0] / 281474976710656.0
-            self.P11 = struct.unpack('b', bytes([cal_data[20]]))[0] / 36893488147419103232.0
+            self._parse_calibration(self.bus.read_i2c_block_data(self.address, 0x31, 21))
         except Exception as e:
             print(f"BMP388 calibration read error: {e}")
             raise
     
+    def _parse_calibration(self, cal_data):
+        """Parse the 21 calibration bytes into floating point coefficients"""
+        import struct
+        self.T1 = struct.unpack('<H', bytes(cal_data[0:2]))[0] / 0.00390625
+        self.T2 = struct.unpack('<H', bytes(cal_data[2:4]))[0] / 1073741824.0
+        self.T3 = struct.unpack('b', bytes([cal_data[4]]))[0] / 281474976710656.0
+        
+        self.P1 = (struct.unpack('<h', bytes(cal_data[5:7]))[0] - 16384) / 1048576.0
+        self.P2 = (struct.unpack('<h', bytes(cal_data[7:9]))[0] - 16384) / 536870912.0
+        self.P3 = struct.unpack('b', bytes([cal_data[9]]))[0] / 4294967296.0
+        self.P4 = struct.unpack('b', bytes([cal_data[10]]))[0] / 137438953472.0
+        self.P5 = struct.unpack('<H', bytes(cal_data[11:13]))[0] / 0.125
+        self.P6 = struct.unpack('<H', bytes(cal_data[13:15]))[0] / 64.0
+        self.P7 = struct.unpack('b', bytes([cal_data[15]]))[0] / 256.0
+        self.P8 = struct.unpack('b', bytes([cal_data[16]]))[0] / 32768.0
+        self.P9 = struct.unpack('<h', bytes(cal_data[17:19]))[0] / 281474976710656.0
+        self.P10 = struct.unpack('b', bytes([cal_data[19]]))[0] / 281474976710656.0
+        self.P11 = struct.unpack('b', bytes([cal_data[20]]))[0] / 36893488147419103232.0
+    
     def _configure(self):
         """Configure sensor for normal operation"""
         try:
             # Set oversampling and power mode
             self.bus.write_byte_data(self.address, 0x1B, 0x33)  # Enable pressure and temp, normal mode
             self.bus.write_byte_data(self.address, 0x1C, 0x00)  # ODR and filter settings
-            time.sleep(0.1)
+
+            # wait for the first conversion rather than a fixed 0.1 s
+            deadline = time.monotonic() + 0.1
+            while time.monotonic() < deadline:
+                if self.bus.read_byte_data(self.address, self.STATUS_REGISTER) & self.DATA_READY == self.DATA_READY:
+                    break
+                time.sleep(0.002)
         except Exception as e:
             print(f"BMP388 configuration error: {e}")
             raise
     
+    def _compensate(self, adc_p, adc_t):
+        """Compensate one raw (adc_p, adc_t) pair, return (temperature in Celsius, pressure in hPa)"""
+        # Compensate temperature
+        partial_data1 = adc_t - self.T1
+        partial_data2 = partial_data1 * self.T2
+        temperature = partial_data2 + (partial_data1 * partial_data1) * self.T3
+        
+        # Compensate pressure
+        partial_data1 = self.P6 * temperature
+        partial_data2 = self.P7 * (temperature * temperature)
+        partial_data3 = self.P8 * (temperature * temperature * temperature)
+        partial_out1 = self.P5 + partial_data1 + partial_data2 + partial_data3
+        
+        partial_data1 = self.P2 * temperature
+        partial_data2 = self.P3 * (temperature * temperature)
+        partial_data3 = self.P4 * (temperature * temperature * temperature)
+        partial_out2 = adc_p * (self.P1 + partial_data1 + partial_data2 + partial_data3)
+        
+        partial_data1 = adc_p * adc_p
+        partial_data2 = self.P9 + self.P10 * temperature
+        partial_data3 = partial_data1 * partial_data2
+        partial_data4 = partial_data3 + (adc_p * adc_p * adc_p) * self.P11
+        
+        pressure = partial_out1 + partial_out2 + partial_data4
+        return temperature, pressure / 100.0  # Convert to hPa
+    
+    def compensate_batch(self, adc_p, adc_t):
+        """
+        Compensate whole arrays of raw counts at once (a window, a FIFO drain or stored raw data).
+        same polynomial and operation order as _compensate, which stays the reference.
+        returns (temperature array in Celsius, pressure array in hPa), needs numpy
+        """
+        import numpy as np  # only batch users pay for the numpy import
+        adc_p = np.asarray(adc_p, dtype=np.float64)
+        adc_t = np.asarray(adc_t, dtype=np.float64)
+
+        partial_data1 = adc_t - self.T1
+        temperature = partial_data1 * self.T2 + (partial_data1 * partial_data1) * self.T3
+        temperature_2 = temperature * temperature
+        temperature_3 = temperature_2 * temperature
+
+        partial_out1 = self.P5 + self.P6 * temperature + self.P7 * temperature_2 + self.P8 * temperature_3
+        partial_out2 = adc_p * (self.P1 + self.P2 * temperature + self.P3 * temperature_2 + self.P4 * temperature_3)
+        adc_p_2 = adc_p * adc_p
+        partial_data4 = adc_p_2 * (self.P9 + self.P10 * temperature) + (adc_p_2 * adc_p) * self.P11
+
+        pressure = partial_out1 + partial_out2 + partial_data4
+        return temperature, pressure / 100.0
+
+    @classmethod
+    def offline(cls, coefficients):
+        """
+        A BMP388 with no bus, for compensating stored raw counts.
+        coefficients maps CALIBRATION_FIELDS to values, e.g. the 'coefficients' of BMP388_CALIBRATION_CACHE
+        """
+        sensor = cls.__new__(cls)
+        sensor.bus = None
+        sensor.bus_number = None
+        sensor.address = None
+        sensor._temperature = None
+        sensor._pressure = None
+        sensor.raw = None
+        sensor.fifo_raw = []
+        for field in cls.CALIBRATION_FIELDS:
+            setattr(sensor, field, float(coefficients[field]))
+        return sensor
+    
     def _read_data(self):
         """Read temperature and pressure"""
         try:
@@ -110,33 +343,89 @@ class BMP388:
             adc_p = data[0] | (data[1] << 8) | (data[2] << 16)
             adc_t = data[3] | (data[4] << 8) | (data[5] << 16)
             
-            # Compensate temperature
-            partial_data1 = adc_t - self.T1
-            partial_data2 = partial_data1 * self.T2
-            self._temperature = partial_data2 + (partial_data1 * partial_data1) * self.T3
-            
-            # Compensate pressure
-            partial_data1 = self.P6 * self._temperature
-            partial_data2 = self.P7 * (self._temperature * self._temperature)
-            partial_data3 = self.P8 * (self._temperature * self._temperature * self._temperature)
-            partial_out1 = self.P5 + partial_data1 + partial_data2 + partial_data3
-            
-            partial_data1 = self.P2 * self._temperature
-            partial_data2 = self.P3 * (self._temperature * self._temperature)
-            partial_data3 = self.P4 * (self._temperature * self._temperature * self._temperature)
-            partial_out2 = adc_p * (self.P1 + partial_data1 + partial_data2 + partial_data3)
-            
-            partial_data1 = adc_p * adc_p
-            partial_data2 = self.P9 + self.P10 * self._temperature
-            partial_data3 = partial_data1 * partial_data2
-            partial_data4 = partial_data3 + (adc_p * adc_p * adc_p) * self.P11
-            
-            self._pressure = partial_out1 + partial_out2 + partial_data4
-            self._pressure = self._pressure / 100.0  # Convert to hPa
+            self.raw = (adc_p, adc_t)
+            self._temperature, self._pressure = self._compensate(adc_p, adc_t)
         except Exception as e:
             print(f"BMP388 read error: {e}")
             self._temperature = INVALID_READING
             self._pressure = INVALID_READING
+            self.raw = None
+
+    def start_fifo(self, odr_sel=BMP388_FIFO_ODR):
+        """
+        Flush and enable the FIFO for pressure + temperature frames at output data rate `odr_sel`
+        (200 Hz / 2**odr_sel). returns how long the FIFO takes to fill, in seconds
+        """
+        self.bus.write_byte_data(self.address, self.CMD_REGISTER, self.FIFO_FLUSH)
+        self.bus.write_byte_data(self.address, self.ODR_REGISTER, odr_sel)
+        self.bus.write_byte_data(self.address, self.FIFO_CONFIG_2_REGISTER, 0x00)  # no subsampling, unfiltered data
+        self.bus.write_byte_data(self.address, self.FIFO_CONFIG_1_REGISTER, 0x19)  # fifo_mode, press_en, temp_en
+        frames = self.FIFO_SIZE // 7
+        return frames * (2 ** odr_sel) / 200.0
+
+    def read_fifo_raw(self):
+        """Drain the FIFO in one burst read, return the raw (adc_p, adc_t) pairs of its complete frames"""
+        length = self.bus.read_i2c_block_data(self.address, self.FIFO_LENGTH_REGISTER, 2)
+        n_bytes = length[0] | ((length[1] & 0x01) << 8)
+        if n_bytes == 0:
+            return []
+
+        # a single write-then-read transaction, the register address auto-increments through FIFO_DATA
+        write = i2c_msg.write(self.address, [self.FIFO_DATA_REGISTER])
+        read = i2c_msg.read(self.address, n_bytes)
+        self.bus.i2c_rdwr(write, read)
+        buffer = bytes(read)
+
+        samples = []
+        i = 0
+        while i < len(buffer):
+            header = buffer[i]
+            if header == self.FRAME_TEMP_PRESS:
+                if i + 7 > len(buffer):
+                    break  # partial frame at the end of the burst
+                adc_t = buffer[i + 1] | (buffer[i + 2] << 8) | (buffer[i + 3] << 16)
+                adc_p = buffer[i + 4] | (buffer[i + 5] << 8) | (buffer[i + 6] << 16)
+                samples.append((adc_p, adc_t))
+                i += 7
+            elif header in (self.FRAME_TEMP, self.FRAME_PRESS, self.FRAME_SENSOR_TIME):
+                i += 4  # not enabled, skip the payload
+            elif header in (self.FRAME_CONFIG_ERROR, self.FRAME_CONFIG_CHANGE):
+                i += 2
+            else:
+                break  # empty frame or unknown header, nothing more to read
+        return samples
+
+    def read_fifo(self):
+        """Drain the FIFO, return a list of compensated (temperature, pressure) samples"""
+        try:
+            self.fifo_raw = self.read_fifo_raw()
+            return [self._compensate(adc_p, adc_t) for adc_p, adc_t in self.fifo_raw]
+        except Exception as e:
+            print(f"BMP388 FIFO read error: {e}")
+            self.fifo_raw = []
+            return []
+
+    def stop_fifo(self):
+        """Disable and flush the FIFO and restore the default ODR, the data registers keep updating in normal mode"""
+        try:
+            self.bus.write_byte_data(self.address, self.FIFO_CONFIG_1_REGISTER, 0x00)
+            self.bus.write_byte_data(self.address, self.CMD_REGISTER, self.FIFO_FLUSH)
+            self.bus.write_byte_data(self.address, self.ODR_REGISTER, 0x00)
+        except Exception as e:
+            print(f"BMP388 FIFO stop error: {e}")
+    
+    def measure(self):
+        """Read the data registers once, return (temperature in Celsius, pressure in hPa)"""
+        self._read_data()
+        return self._temperature, self._pressure
+    
+    def trigger(self):
+        """Nothing to start, normal mode converts continuously"""
+        return 0
+    
+    def collect(self):
+        """Read the latest conversion, return (temperature, pressure)"""
+        return self.measure()
     
     @property
     def temperature(self):
@@ -158,6 +447,20 @@ class MockSensor:
         self.base_temp = 22.0
         self.base_humidity = 60.0
         self.base_pressure = 1013.25
+        self.raw = None  # no raw counts behind simulated values
+        self.fifo_raw = []
+    
+    def measure(self):
+        """Same tuple as the matching hardware sensor's measure()"""
+        if self.sensor_type == 'sht30':
+            return self.temperature, self.relative_humidity
+        return self.temperature, self.pressure
+
+    def trigger(self):
+        return 0
+    
+    def collect(self):
+        return self.measure()
     
     @property
     def temperature(self):
@@ -180,6 +483,136 @@ def safe_average(values):
     valid_values = [val for val in values if val != INVALID_READING]
     return sum(valid_values) / len(valid_values) if valid_values else INVALID_READING
 
+CHANNELS = ('exterior_temp', 'enclosure_temp', 'humidity', 'pressure')
+
+class P2Median:
+    """
+    Streaming median estimate in constant memory, the P-squared algorithm (Jain & Chlamtac 1985).
+    keeps five markers whose heights track the min, quartiles, median and max as values arrive
+    """
+    __slots__ = ('heights', 'positions', 'desired', 'count')
+
+    INCREMENTS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+    def __init__(self):
+        self.heights = []
+        self.positions = [0, 1, 2, 3, 4]
+        self.desired = [0.0, 1.0, 2.0, 3.0, 4.0]
+        self.count = 0
+
+    def add(self, x):
+        self.count += 1
+        heights = self.heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+
+        # find the cell x falls in, stretching the end markers if it is a new extreme
+        if x < heights[0]:
+            heights[0] = x
+            k = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= heights[k + 1]:
+                k += 1
+
+        positions = self.positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.INCREMENTS[i]
+
+        # nudge the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                d = 1 if d > 0 else -1
+                height = heights[i] + d / (positions[i + 1] - positions[i - 1]) * (
+                    (positions[i] - positions[i - 1] + d) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+                    + (positions[i + 1] - positions[i] - d) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+                if not heights[i - 1] < height < heights[i + 1]:
+                    # parabolic step overshot a neighbour, fall back to linear
+                    height = heights[i] + d * (heights[i + d] - heights[i]) / (positions[i + d] - positions[i])
+                heights[i] = height
+                positions[i] += d
+
+    @property
+    def value(self):
+        if self.count > 5:
+            return self.heights[2]
+        if not self.heights:
+            return INVALID_READING
+        middle = len(self.heights) // 2
+        if len(self.heights) % 2:
+            return self.heights[middle]
+        return (self.heights[middle - 1] + self.heights[middle]) / 2
+
+class ChannelStats:
+    """
+    Running statistics for one channel of the averaging window, O(1) time and memory per sample.
+    mean/variance by Welford's method, INVALID_READING values are counted but kept out of the statistics
+    """
+    __slots__ = ('valid', 'invalid', 'mean', 'm2', 'min', 'max', 'median')
+
+    def __init__(self, track_median=STREAM_MEDIAN):
+        self.valid = 0
+        self.invalid = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.median = P2Median() if track_median else None
+
+    def add(self, value):
+        if value == INVALID_READING or value is None:
+            self.invalid += 1
+            return
+        self.valid += 1
+        delta = value - self.mean
+        self.mean += delta / self.valid
+        self.m2 += delta * (value - self.mean)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if self.median is not None:
+            self.median.add(value)
+
+    @property
+    def average(self):
+        """mean of the valid samples, INVALID_READING if there were none (same as safe_average)"""
+        return self.mean if self.valid else INVALID_READING
+
+    @property
+    def std(self):
+        """sample standard deviation, INVALID_READING with fewer than two valid samples"""
+        return (self.m2 / (self.valid - 1)) ** 0.5 if self.valid > 1 else INVALID_READING
+
+    def settled(self, tolerance):
+        """True once the standard error of the mean is within tolerance, or there is nothing valid to wait for"""
+        if self.valid == 0:
+            return True
+        if self.valid < 2:
+            return False
+        return (self.m2 / (self.valid - 1) / self.valid) ** 0.5 <= tolerance
+
+    def summary(self, channel):
+        """the extra statistics as '<channel>_<stat>' keys, the names database.EXTRA_STAT_KEYS logs"""
+        stats = {
+            f"{channel}_std": self.std,
+            f"{channel}_min": self.min if self.valid else INVALID_READING,
+            f"{channel}_max": self.max if self.valid else INVALID_READING,
+            f"{channel}_valid": self.valid,
+            f"{channel}_invalid": self.invalid,
+        }
+        if self.median is not None:
+            stats[f"{channel}_median"] = self.median.value
+        return stats
+
 def initialize_sensors():
     """Initialize SHT30 and BMP388 sensors"""
     sensors = {}
@@ -214,26 +647,89 @@ def initialize_mock_sensors():
     print("Mock sensors initialized")
     return sensors
 
-def read_all_sensors(sensors):
-    """Read data from all sensors and return as dictionary"""
-    try:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def sensors_reusable(sensors, sensor_data):
+    """
+    whether sensors from initialize_sensors() can be kept for the next cycle. a mock fallback on real
+    hardware (bus not ready yet) or a cycle where no channel read anything means the next cycle reinitializes
+    """
+    if not sensors or not sensor_data:
+        return False
+    if HARDWARE_AVAILABLE and any(isinstance(sensor, MockSensor) for sensor in sensors.values()):
+        return False
+    return any(sensor_data.get(channel, INVALID_READING) != INVALID_READING for channel in CHANNELS)
+
+def _sample_group(sensors, names):
+    """
+    Trigger every named sensor, then collect each one as soon as its conversion is ready.
+    sensors with nothing to wait for (BMP388 in normal mode) are read during the others' conversion wait
+    """
+    ready_at = {}
+    for name in names:
+        try:
+            wait = sensors[name].trigger()
+            ready_at[name] = time.monotonic() + (wait or 0)
+        except Exception as e:
+            print(f"{name} trigger error: {e}")
+            if hasattr(sensors[name], 'raw'):
+                sensors[name].raw = None  # collect() is skipped, don't leave the previous sample's counts for the capture
 
-        # Read SHT30
+    results = {name: None for name in names}
+    for name in sorted(ready_at, key=ready_at.get):
+        remaining = ready_at[name] - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
         try:
-            exterior_temp = sensors['sht30'].temperature
-            humidity = sensors['sht30'].relative_humidity
+            results[name] = sensors[name].collect()
         except Exception as e:
-            print(f"SHT30 read error: {e}")
+            print(f"{name} read error: {e}")
+            if hasattr(sensors[name], 'raw'):
+                sensors[name].raw = None
+    return results
+
+def sample_sensors(sensors, names=None):
+    """
+    Take one sample of every sensor in `names` (default all), pipelined so that a sample costs
+    about as long as the slowest sensor rather than the sum of all of them.
+    sensors on different I2C buses are sampled in parallel threads.
+    returns {name: channel tuple from collect(), or None if the sensor failed}
+    """
+    if names is None:
+        names = list(sensors)
+
+    groups = {}
+    for name in names:
+        groups.setdefault(getattr(sensors[name], 'bus_number', None), []).append(name)
+    if len(groups) <= 1:
+        return _sample_group(sensors, names)
+
+    from concurrent.futures import ThreadPoolExecutor
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(groups)) as pool:
+        for group_results in pool.map(lambda group: _sample_group(sensors, group), groups.values()):
+            results.update(group_results)
+    return results
+
+def read_all_sensors(sensors, include_bmp388=True):
+    """
+    Read data from all sensors and return as dictionary
+    include_bmp388=False leaves the BMP388 channels INVALID_READING, used while its FIFO is collecting
+    """
+    try:
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Trigger both sensors, wait once, collect both; one conversion gives both channels of each
+        names = ['sht30', 'bmp388'] if include_bmp388 else ['sht30']
+        results = sample_sensors(sensors, names)
+
+        if results.get('sht30') is not None:
+            exterior_temp, humidity = results['sht30']
+        else:
             exterior_temp = INVALID_READING
             humidity = INVALID_READING
         
-        # Read BMP388
-        try:
-            enclosure_temp = sensors['bmp388'].temperature
-            pressure = sensors['bmp388'].pressure
-        except Exception as e:
-            print(f"BMP388 read error: {e}")
+        if results.get('bmp388') is not None:
+            enclosure_temp, pressure = results['bmp388']
+        else:
             enclosure_temp = INVALID_READING
             pressure = INVALID_READING
         
@@ -249,53 +745,178 @@ def read_all_sensors(sensors):
         print(f"Sensor reading failed: {e}")
         return None
 
-def read_sensors_over_interval(sensors, period=AVERAGING_PERIOD, interval=READING_INTERVAL):
+def read_sensors_over_interval(sensors, period=AVERAGING_PERIOD, interval=READING_INTERVAL, adaptive=ADAPTIVE_AVERAGING):
     """
     Reads all sensors in sensors for `period` seconds, taking readings at `interval` second intervals
+    adaptive=True stops as soon as every channel has settled (see ADAPTIVE_TOLERANCE), after at least ADAPTIVE_MIN_PERIOD seconds
     """
     n_readings = int(period // interval)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    ext_temps = []
-    encl_temps = []
-    hums = []
-    presses = []
-    
-    for i in range(n_readings):
+    # in periodic mode the SHT30 measures on its own clock and each reading just fetches the latest result
+    sht30 = sensors.get('sht30')
+    periodic = SHT30_MODE == "periodic" and hasattr(sht30, 'start_periodic')
+    if periodic:
+        try:
+            time.sleep(sht30.start_periodic(SHT30_MPS))  # first result is ready after one period
+        except Exception as e:
+            print(f"SHT30 periodic start failed, using single shot: {e}")
+            periodic = False
+
+    # in FIFO mode the BMP388 buffers its own samples through the window and is drained in bursts
+    bmp388 = sensors.get('bmp388')
+    fifo = BMP388_FIFO and hasattr(bmp388, 'start_fifo')
+    fifo_span = None
+    if fifo:
+        try:
+            fifo_span = bmp388.start_fifo(BMP388_FIFO_ODR)
+        except Exception as e:
+            print(f"BMP388 FIFO start failed, reading registers: {e}")
+            fifo = False
+    try:
+        return _sample_window(sensors, timestamp, n_readings, interval, fifo_span if fifo else None,
+                              min_period=ADAPTIVE_MIN_PERIOD if adaptive else None)
+    finally:
+        if periodic:
+            sht30.stop_periodic()
+        if fifo:
+            bmp388.stop_fifo()
+
+def _settled(stats, channels):
+    """True when every channel in `channels` is within its ADAPTIVE_TOLERANCE"""
+    return all(stats[channel].settled(ADAPTIVE_TOLERANCE[channel]) for channel in channels)
+
+def _drain_fifo(bmp388, stats, capture=None):
+    """Drain the BMP388 FIFO into the enclosure_temp/pressure stats, and its raw counts into capture if given"""
+    for temperature, pressure in bmp388.read_fifo():
+        stats['enclosure_temp'].add(temperature)
+        stats['pressure'].add(pressure)
+    if capture is not None:
+        drained = time.monotonic()
+        capture.extend((drained, None, raw) for raw in bmp388.fifo_raw)
+
+def _sample_window(sensors, timestamp, n_readings, interval, fifo_span=None, min_period=None):
+    """
+    Take `n_readings` readings on a fixed `interval` second grid and average them.
+    each reading is scheduled against a monotonic deadline, a slow read eats into the wait before the
+    next slot instead of pushing every later slot back, and slots already passed are skipped and counted.
+    with fifo_span set the BMP388 is not read per sample, its FIFO is drained before it can fill and at the end
+    with min_period set the window ends early once every channel has settled and min_period seconds have passed
+    with RAW_CAPTURE each sample's raw counts are kept and written to the raw capture file after the window closes
+    """
+    stats = {channel: ChannelStats() for channel in CHANNELS}
+    capture = [] if RAW_CAPTURE else None
+
+    fifo = fifo_span is not None
+    if fifo:
+        next_drain = time.monotonic() + 0.75 * fifo_span
+
+    start = time.monotonic()
+    samples = 0
+    missed = 0
+    attempted = 0
+    late_sq_total = 0.0
+    late_max = 0.0
+    slot = 0
+    stop_reason = "period"
+    while slot < n_readings:
+        deadline = start + slot * interval
+        now = time.monotonic()
+        if now < deadline:
+            time.sleep(deadline - now)
+            now = time.monotonic()
+        elif now - deadline >= interval:
+            # a read overran whole slots, skip to the slot we are in now
+            skipped = min(int((now - deadline) // interval), n_readings - slot)
+            missed += skipped
+            slot += skipped
+            continue
+        slot += 1
+        attempted += 1
+
+        late = now - deadline
+        late_sq_total += late * late
+        late_max = max(late_max, late)
+
         # Take reading
-        readings = read_all_sensors(sensors)
+        readings = read_all_sensors(sensors, include_bmp388=not fifo)
         
         if readings is None:
-            time.sleep(interval)
+            missed += 1
             continue
+        samples += 1
+        if capture is not None:
+            capture.append((now, getattr(sensors.get('sht30'), 'raw', None),
+                            None if fifo else getattr(sensors.get('bmp388'), 'raw', None)))
+
+        stats['exterior_temp'].add(readings['exterior_temp'])
+        stats['humidity'].add(readings['humidity'])
+        if not fifo:
+            stats['enclosure_temp'].add(readings['enclosure_temp'])
+            stats['pressure'].add(readings['pressure'])
+        elif time.monotonic() >= next_drain:
+            _drain_fifo(sensors['bmp388'], stats, capture)
+            next_drain = time.monotonic() + 0.75 * fifo_span
+
+        if min_period is not None and time.monotonic() - start >= min_period:
+            if fifo and _settled(stats, ('exterior_temp', 'humidity')):
+                # the BMP388 channels only fill in on a drain, bring them up to date before deciding
+                _drain_fifo(sensors['bmp388'], stats, capture)
+                next_drain = time.monotonic() + 0.75 * fifo_span
+            if _settled(stats, CHANNELS):
+                stop_reason = "settled"
+                break
+
+    if stop_reason == "period":
+        # the window closes one interval after the last slot, same length as period
+        remaining = start + n_readings * interval - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    if fifo:
+        # one burst read for everything buffered since the last drain
+        _drain_fifo(sensors['bmp388'], stats, capture)
+        if not stats['pressure'].valid + stats['pressure'].invalid:
+            # FIFO gave nothing, fall back to a direct register read
+            enclosure_temp, pressure = sensors['bmp388'].measure()
+            stats['enclosure_temp'].add(enclosure_temp)
+            stats['pressure'].add(pressure)
+            if capture is not None:
+                capture.append((time.monotonic(), None, getattr(sensors['bmp388'], 'raw', None)))
 
-        ext_temps.append(readings['exterior_temp'])
-        encl_temps.append(readings['enclosure_temp'])
-        hums.append(readings['humidity'])
-        presses.append(readings['pressure'])
-        
-        time.sleep(interval)
-    
-    # Filter out invalid readings
-    ext_temps = [val for val in ext_temps if val != INVALID_READING]
-    encl_temps = [val for val in encl_temps if val != INVALID_READING]
-    hums = [val for val in hums if val != INVALID_READING]
-    presses = [val for val in presses if val != INVALID_READING]
     
     avg_data = {
         'timestamp': timestamp,
-        'exterior_temp': safe_average(ext_temps),
-        'enclosure_temp': safe_average(encl_temps),
-        'humidity': safe_average(hums),
-        'pressure': safe_average(presses)
+        'exterior_temp': stats['exterior_temp'].average,
+        'enclosure_temp': stats['enclosure_temp'].average,
+        'humidity': stats['humidity'].average,
+        'pressure': stats['pressure'].average,
+        'samples': samples,
+        'missed_slots': missed,
+        'stop_reason': stop_reason,
+        'window_s': round(time.monotonic() - start, 2),
+        'jitter_ms': round(1000 * (late_sq_total / max(attempted, 1)) ** 0.5, 2),
+        'max_late_ms': round(1000 * late_max, 2)
     }
+    for channel in CHANNELS:
+        avg_data.update(stats[channel].summary(channel))
+
+    if capture:
+        try:
+            append_raw_frames(timestamp, capture)
+        except OSError as e:
+            print(f"Raw capture write failed: {e}")
 
     return avg_data
 
 def test_sensors():
     """Test function to verify sensor readings"""
     print("Testing sensor initialization...")
+    start = time.perf_counter()
     sensors = initialize_sensors()
+    initialized = time.perf_counter()
+    read_all_sensors(sensors)
+    print(f"initialized in {(initialized - start) * 1000:.1f} ms, first sample after {(time.perf_counter() - start) * 1000:.1f} ms")
     
     print("\nTaking test readings...")
     for i in range(3):
@@ -306,5 +927,41 @@ def test_sensors():
             print(f"Reading {i+1}: FAILED")
         time.sleep(2)
 
+# a calibration dump for checks that run without hardware
+SAMPLE_BMP388_CALIBRATION = [0x3B, 0x6B, 0x7D, 0x48, 0xF9, 0x2E, 0x04, 0x6E, 0x01, 0x35, 0x06,
+                             0x6A, 0x48, 0xE2, 0x5E, 0x02, 0xE8, 0xF6, 0x18, 0x00, 0x00]
+
+def test_batch_compensation(n=10000):
+    """Check BMP388.compensate_batch against the scalar _compensate over random raw counts, no hardware needed"""
+    import random
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        print("numpy not installed, skipping batch compensation check")
+        return None
+
+    sensor = BMP388.offline({field: 0 for field in BMP388.CALIBRATION_FIELDS})
+    sensor._parse_calibration(SAMPLE_BMP388_CALIBRATION)
+    adc_p = [random.randint(0, 2**24 - 1) for _ in range(n)]
+    adc_t = [random.randint(0, 2**24 - 1) for _ in range(n)]
+
+    start = time.perf_counter()
+    scalar = [sensor._compensate(p, t) for p, t in zip(adc_p, adc_t)]
+    scalar_time = time.perf_counter() - start
+    start = time.perf_counter()
+    temperatures, pressures = sensor.compensate_batch(adc_p, adc_t)
+    batch_time = time.perf_counter() - start
+
+    worst = 0.0
+    for (temperature, pressure), batch_temperature, batch_pressure in zip(scalar, temperatures, pressures):
+        worst = max(worst,
+                    abs(batch_temperature - temperature) / max(abs(temperature), 1.0),
+                    abs(batch_pressure - pressure) / max(abs(pressure), 1.0))
+    passed = worst <= 1e-12
+    print(f"{'✓' if passed else '✗'} batch compensation over {n} samples: worst relative difference {worst:.1e}, "
+          f"scalar {scalar_time * 1000:.1f} ms, batch {batch_time * 1000:.1f} ms")
+    return passed
+
 if __name__ == "__main__":
+    test_batch_compensation()
     test_sensors()
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""
+upload scheduling: when the last upload and attempt happened and whether one is due.
+only reads small state files, so main.py can check it every cycle without loading web_server and the network stack
+"""
+from datetime import datetime, timedelta
+from config import LAST_UPLOAD_FILE, UPLOAD_INTERVAL_HOURS, UPLOAD_RETRY_BASE_MINUTES, UPLOAD_RETRY_MAX_HOURS, UPLOAD_FAILURES_FILE
+
+def get_last_upload_time():
+    """Read last upload timestamp from file"""
+    try:
+        with open(LAST_UPLOAD_FILE, 'r') as f:
+            timestamp_str = f.read().strip()
+            return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+    except (FileNotFoundError, ValueError):
+        # no prev uploads, start from 7 days ago
+        return datetime.now() - timedelta(days=7)
+
+def save_last_upload_time(timestamp):
+    """Save successfull upload timestamp"""
+    with open(LAST_UPLOAD_FILE, 'w') as f:
+        f.write(timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+
+def get_upload_failures():
+    """number of upload attempts in a row that made no progress"""
+    try:
+        with open(UPLOAD_FAILURES_FILE, 'r') as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def save_upload_failures(failures):
+    with open(UPLOAD_FAILURES_FILE, 'w') as f:
+        f.write(str(failures))
+
+def get_retry_wait(failures):
+    """seconds to wait before retrying after `failures` failed attempts, doubling up to UPLOAD_RETRY_MAX_HOURS"""
+    minutes = UPLOAD_RETRY_BASE_MINUTES * 2 ** max(failures - 1, 0)
+    return min(minutes * 60, UPLOAD_RETRY_MAX_HOURS * 3600)
+
+def get_last_upload_attempt_time():
+    """Get timestamp of last upload attempt (successful or failed)"""
+    try:
+        with open('last_upload_attempt.txt', 'r') as f:
+            timestamp_str = f.read().strip()
+            return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
+    except (FileNotFoundError, ValueError):
+        return datetime.now() - timedelta(days=2)  # Force attempt on first run
+
+def save_upload_attempt_time(timestamp):
+    """Save timestamp of upload attempt"""
+    with open('last_upload_attempt.txt', 'w') as f:
+        f.write(timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+
+def get_next_scheduled_upload():
+    """Get the next scheduled upload time (fixed daily schedule)"""
+    now = datetime.now()
+    # Set to today at midnight, then add config hours to get next upload time
+    next_upload = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=UPLOAD_INTERVAL_HOURS)
+    return next_upload
+
+def should_upload():
+    """Check if it's time for the scheduled upload, or for a retry after the backoff wait"""
+    now = datetime.now()
+    last_success = get_last_upload_time()
+    last_attempt = get_last_upload_attempt_time()
+    
+    # If we successfully uploaded in the last config hours, don't upload
+    if (now - last_success).total_seconds() < (UPLOAD_INTERVAL_HOURS * 3600):
+        return False
+    
+    # Check if we're in the daily upload window (e.g., between 00:00-01:00)
+    if now.hour == 0:  # Primary upload window
+        return True
+    
+    # Otherwise retry with an exponentially growing wait after each failed attempt
+    if (now - last_attempt).total_seconds() >= get_retry_wait(get_upload_failures()):
+        return True
+    
+    return False
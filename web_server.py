@@ -1,53 +1,143 @@
 import os
 import subprocess
 import time
-import requests
 import json
+import zlib
+from itertools import islice
 from datetime import datetime, timedelta
 from config import *
 #from flask import Flask, jsonify, request, make_response
-from database import log_error, read_data_range, read_error_logs
+from upload_schedule import get_last_upload_time, save_last_upload_time, get_upload_failures, save_upload_failures, get_retry_wait, get_last_upload_attempt_time, save_upload_attempt_time, get_next_scheduled_upload, should_upload
+from database import log_error, read_data_range, read_error_logs, read_last_reading, iter_records_backwards, is_timestamp, iter_data_range, iter_error_logs, find_start_offset, file_identity, complete_offset, iter_data_from_offset, iter_errors_from_offset
 
 # upload config
 #COPYPARTY_SERVER = "192.168.1.100" # replace with copyparty ip
 #COPYPARTY_PORT = 3923 # replace with copyparty port
 #UPLOAD_INTERVAL_HOURS = 24 # daily
 
-def get_last_upload_time():
-    """Read last upload timestamp from file"""
+# one HTTP session per cycle, the upload and the update check share its keep-alive connection
+_session = None
+
+def get_session():
+    """the cycle's requests.Session, created on first use"""
+    global _session
+    if _session is None:
+        import requests  # the network stack is only loaded on upload cycles
+        _session = requests.Session()
+    return _session
+
+def _connection_stats(session):
+    """(requests sent, connections opened) across the session's connection pools"""
+    sent = opened = 0
+    for adapter in session.adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            sent += pool.num_requests
+            opened += pool.num_connections
+    return sent, opened
+
+def close_session():
+    """close the cycle's session, returning how many requests it sent over how many connections (handshakes)"""
+    global _session
+    if _session is None:
+        return "no HTTP requests this cycle"
     try:
-        with open(LAST_UPLOAD_FILE, 'r') as f:
-            timestamp_str = f.read().strip()
-            return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-    except (FileNotFoundError, ValueError):
-        # no prev uploads, start from 7 days ago
-        return datetime.now() - timedelta(days=7)
-
-def save_last_upload_time(timestamp):
-    """Save successfull upload timestamp"""
-    with open(LAST_UPLOAD_FILE, 'w') as f:
-        f.write(timestamp.strftime("%Y-%m-%d %H:%M:%S"))
-
-def get_last_upload_attempt_time():
-    """Get timestamp of last upload attempt (successful or failed)"""
+        sent, opened = _connection_stats(_session)
+        summary = f"{sent} HTTP request(s) over {opened} connection(s)"
+    except AttributeError:
+        summary = "HTTP session closed"  # connection pool internals not available
+    _session.close()
+    _session = None
+    return summary
+
+def load_upload_cursors():
+    """
+    saved upload cursors, empty if there are none yet:
+    {log: {'inode', 'head', 'offset'}} for csv logs, {log: {'after': timestamp}} for the binary/partitioned data
+    """
     try:
-        with open('last_upload_attempt.txt', 'r') as f:
-            timestamp_str = f.read().strip()
-            return datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S")
-    except (FileNotFoundError, ValueError):
-        return datetime.now() - timedelta(days=2)  # Force attempt on first run
-
-def save_upload_attempt_time(timestamp):
-    """Save timestamp of upload attempt"""
-    with open('last_upload_attempt.txt', 'w') as f:
-        f.write(timestamp.strftime("%Y-%m-%d %H:%M:%S"))
-
-def get_next_scheduled_upload():
-    """Get the next scheduled upload time (fixed daily schedule)"""
-    now = datetime.now()
-    # Set to today at midnight, then add config hours to get next upload time
-    next_upload = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=UPLOAD_INTERVAL_HOURS)
-    return next_upload
+        with open(UPLOAD_CURSOR_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_upload_cursors(cursors):
+    """save upload cursors, replacing the file in one step"""
+    temp_path = f"{UPLOAD_CURSOR_FILE}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(cursors, f)
+    os.replace(temp_path, UPLOAD_CURSOR_FILE)
+
+def _rows_after(rows, after_str, progress):
+    """the rows timestamped after after_str, noting the last one handed out in progress['after']"""
+    for row in rows:
+        if after_str and row['timestamp'] <= after_str:
+            continue
+        progress['after'] = row['timestamp']
+        yield row
+
+def plan_upload_sources(last_upload, current_time, cursors, pending):
+    """
+    Pick where each log's upload starts. a csv log that is still the file its cursor was taken from
+    (same inode, same header and first row, not shorter) resumes at the cursor's byte offset; a rotated,
+    compacted or never uploaded one starts at the first row after last_upload. the binary/partitioned data
+    resumes by timestamp. pending[log] tracks how far the returned rows have been read, see _progress_cursors.
+    returns {log: iterator of rows}
+    """
+    last_upload_str = last_upload.strftime("%Y-%m-%d %H:%M:%S")
+    logs = {'error_logs': (ERROR_LOG_FILE, iter_errors_from_offset)}
+    if DATA_BACKEND == "csv":
+        logs['weather_data'] = (WEATHER_DATA_FILE, iter_data_from_offset)
+
+    sources = {}
+    for key in ('weather_data', 'error_logs'):
+        cursor = cursors.get(key) or {}
+        if key not in logs:
+            after = max(cursor.get('after', ''), last_upload_str)
+            pending[key] = {'after': after}
+            sources[key] = _rows_after(iter_data_range(start_date=after, end_date=current_time), after, pending[key])
+            continue
+
+        filename, from_offset = logs[key]
+        path = os.path.join(os.getcwd(), filename)
+        if not os.path.isfile(path):
+            sources[key] = iter(())
+            continue
+
+        inode, head = file_identity(path)
+        end_offset = complete_offset(path)
+        if cursor.get('inode') == inode and cursor.get('head') == head and cursor.get('offset', end_offset + 1) <= end_offset:
+            start_offset = cursor['offset']
+            after = None
+        else:
+            # no usable cursor, find the rows after the last upload by timestamp
+            after = last_upload_str
+            start_offset = 0
+            if key == 'weather_data':
+                try:
+                    start_offset = find_start_offset(path, after) or 0
+                except OSError:
+                    pass  # index unusable, scan from the top
+
+        consumed = {'offset': start_offset}
+        pending[key] = {'inode': inode, 'head': head, 'consumed': consumed, 'end_offset': end_offset}
+        rows = from_offset(path, start_offset, end_offset, consumed)
+        sources[key] = _rows_after(rows, after, {}) if after else rows
+    return sources
+
+def _progress_cursors(cursors, pending):
+    """update cursors to how far the pending sources have been read"""
+    for key, progress in pending.items():
+        if 'consumed' in progress:
+            cursors[key] = {'inode': progress['inode'], 'head': progress['head'], 'offset': progress['consumed']['offset']}
+        else:
+            cursors[key] = {'after': progress['after']}
+    return cursors
+
+def _bytes_remaining(pending):
+    """bytes of the csv logs not yet read by the pending sources"""
+    return sum(progress['end_offset'] - progress['consumed']['offset'] for progress in pending.values() if 'consumed' in progress)
 
 def prepare_upload_data():
     """Gather all data since last upload"""
@@ -73,61 +163,197 @@ def prepare_upload_data():
         "status": status_data
     }
 
+def _json_array(items, counts, key):
+    """compact json for a list, one item at a time, counting the items into counts[key]"""
+    yield "["
+    for i, item in enumerate(items):
+        yield ("," if i else "") + json.dumps(item, separators=(',', ':'))
+        counts[key] = i + 1
+    yield "]"
+
+def iter_upload_json(start_date, end_date, counts=None, sources=None, progress=None):
+    """
+    Stream the same bundle as prepare_upload_data() as compact json text pieces.
+    rows are read from disk as they are sent, the status block goes last so its counts are exact.
+    sources ({log: iterable of rows}, see plan_upload_sources) replaces the timestamp scans,
+    progress is added to the status block as upload_progress
+    """
+    if sources is None:
+        sources = {
+            'weather_data': iter_data_range(start_date=start_date, end_date=end_date),
+            'error_logs': iter_error_logs(start_date=start_date, end_date=end_date),
+        }
+    if counts is None:
+        counts = {}
+    counts['weather_data'] = counts['error_logs'] = 0
+    status_data = {
+        "upload_time": end_date.strftime("%Y-%m-%d %H:%M:%S"),
+        "last_reading": get_last_reading(),
+        "last_error": get_last_error(),
+        "system_uptime": get_system_uptime(),
+    }
+
+    yield '{"weather_data":'
+    yield from _json_array(sources['weather_data'], counts, 'weather_data')
+    yield ',"error_logs":'
+    yield from _json_array(sources['error_logs'], counts, 'error_logs')
+
+    status_data["data_points_uploaded"] = counts['weather_data']
+    status_data["errors_uploaded"] = counts['error_logs']
+    if progress is not None:
+        status_data["upload_progress"] = progress
+    yield ',"status":' + json.dumps(status_data, separators=(',', ':')) + '}'
+
+def iter_upload_body(pieces, compress=UPLOAD_COMPRESS, sizes=None):
+    """
+    Encode json text pieces into request body chunks of about UPLOAD_STREAM_BYTES, gzip compressed when compress.
+    sizes, if given, gets the 'json' and 'sent' byte totals
+    """
+    if sizes is None:
+        sizes = {}
+    sizes['json'] = sizes['sent'] = 0
+    compressor = zlib.compressobj(UPLOAD_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None  # wbits 31 = gzip container
+
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        sizes['json'] += len(data)
+        if compressor:
+            data = compressor.compress(data)
+        if data:
+            buffer.append(data)
+            buffered += len(data)
+        if buffered >= UPLOAD_STREAM_BYTES:
+            sizes['sent'] += buffered
+            yield b"".join(buffer)
+            buffer = []
+            buffered = 0
+
+    if compressor:
+        buffer.append(compressor.flush())
+    chunk = b"".join(buffer)
+    sizes['sent'] += len(chunk)
+    if chunk:
+        yield chunk
+
 def upload_to_server():
-    """Upload all weather station data as one bundled file"""
+    """
+    Upload all weather station data since the last upload, streamed from disk as compact (gzipped) json.
+    a backlog goes up in bundles of at most UPLOAD_CHUNK_ROWS rows; the cursors move on as each one is
+    acknowledged, so a failed attempt resumes after the last acknowledged bundle
+    """
+    chunk = 0
     try:
-        upload_data = prepare_upload_data()  # Use your existing function
+        last_upload = get_last_upload_time()
         current_time = datetime.now()
         save_upload_attempt_time(current_time)
         
-        filename = f"weather_bundle_{current_time.strftime('%Y%m%d_%H%M%S')}.json"
-        url = f"http://{COPYPARTY_SERVER}:{COPYPARTY_PORT}/weather//{filename}"
+        session = get_session()
+        bundle_name = f"weather_bundle_{current_time.strftime('%Y%m%d_%H%M%S')}"
         
-        response = requests.put(
-            url,
-            data=json.dumps(upload_data, indent=2),
-            headers={'Content-Type': 'application/json'},
-            timeout=30
-        )
-        
-        if response.status_code in [200, 201]:
-            save_last_upload_time(current_time)
-            return f"Bundle upload successful: {len(upload_data.get('weather_data', []))} weather records"
-        else:
-            return f"Bundle upload failed: HTTP {response.status_code}"
+        # new rows come from the saved byte offsets where the logs are unchanged, by timestamp otherwise
+        cursors = load_upload_cursors()
+        pending = {}
+        sources = plan_upload_sources(last_upload, current_time, cursors, pending)
+
+        totals = {'weather_data': 0, 'error_logs': 0, 'sent': 0}
+        while True:
+            weather_data = list(islice(sources['weather_data'], UPLOAD_CHUNK_ROWS))
+            error_logs = list(islice(sources['error_logs'], UPLOAD_CHUNK_ROWS - len(weather_data)))
+            if chunk and not weather_data and not error_logs:
+                break
+            chunk += 1
+
+            progress = {
+                "chunk": chunk,
+                "weather_data_sent": totals['weather_data'] + len(weather_data),
+                "errors_sent": totals['error_logs'] + len(error_logs),
+                "bytes_remaining": _bytes_remaining(pending),
+            }
+            filename = bundle_name + (f"_{chunk}" if chunk > 1 else "") + (".json.gz" if UPLOAD_COMPRESS else ".json")
+            url = f"http://{COPYPARTY_SERVER}:{COPYPARTY_PORT}/weather//{filename}"
+            counts = {}
+            sizes = {}
+            body = iter_upload_json(last_upload, current_time, counts, {'weather_data': weather_data, 'error_logs': error_logs}, progress)
+            response = session.put(
+                url,
+                data=iter_upload_body(body, sizes=sizes),
+                headers={'Content-Type': 'application/gzip' if UPLOAD_COMPRESS else 'application/json'},
+                timeout=30
+            )
+            if response.status_code not in [200, 201]:
+                _record_upload_failure(chunk > 1)
+                return f"Bundle upload failed at bundle {chunk}: HTTP {response.status_code}"
+
+            # acknowledged, a later attempt picks up after this bundle
+            save_upload_cursors(_progress_cursors(cursors, pending))
+            totals['weather_data'] += counts['weather_data']
+            totals['error_logs'] += counts['error_logs']
+            totals['sent'] += sizes['sent']
+            if len(weather_data) + len(error_logs) < UPLOAD_CHUNK_ROWS:
+                break
+
+        save_last_upload_time(current_time)
+        save_upload_failures(0)
+        return f"Bundle upload successful: {totals['weather_data']} weather records in {chunk} bundle(s), {totals['sent']} bytes sent"
             
     except Exception as e:
+        _record_upload_failure(chunk > 1)
         error_msg = f"Bundle upload failed: {str(e)}"
         log_error(error_msg)
         return error_msg
 
-def should_upload():
-    """Check if it's time for scheduled upload or retry window"""
-    now = datetime.now()
-    last_success = get_last_upload_time()
-    last_attempt = get_last_upload_attempt_time()
-    
-    # If we successfully uploaded in the last config hours, don't upload
-    if (now - last_success).total_seconds() < (UPLOAD_INTERVAL_HOURS * 3600):
-        return False
-    
-    # Check if we're in the daily upload window (e.g., between 00:00-01:00)
-    if now.hour == 0:  # Primary upload window
-        return True
-    
-    # If primary window failed, allow hourly retries until success
-    if (now - last_attempt).total_seconds() >= (UPLOAD_RETRY_INTERVAL_HOURS * 3600):
-        return True
-    
-    return False
+def _record_upload_failure(made_progress):
+    """count a failed attempt for the retry backoff, an attempt that got bundles through starts the backoff over"""
+    try:
+        save_upload_failures(1 if made_progress else get_upload_failures() + 1)
+    except OSError:
+        pass
+
+def load_update_flag_cache():
+    """validators (etag, last_modified) of the flag as it was at the last git pull"""
+    try:
+        with open(UPDATE_FLAG_CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_update_flag_cache(validators):
+    with open(UPDATE_FLAG_CACHE_FILE, 'w') as f:
+        json.dump(validators, f)
 
 def should_update():
-    """Check if a flag file exists on copyparty, and if so, git pull."""
+    """
+    Check if the flag file on copyparty changed since the last git pull, and if so, git pull.
+    the HEAD is conditional on the cached ETag / Last-Modified, an unchanged flag (304, or the same
+    validators from a server that ignores the conditions) costs no git work
+    """
+    import requests
     url = f"http://{COPYPARTY_SERVER}:{COPYPARTY_PORT}/{UPDATE_FLAG}"
     
     try:
-        response = requests.head(url, timeout=5)
+        cached = load_update_flag_cache()
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        response = get_session().head(url, headers=headers, timeout=5)
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+        
+        if response.status_code == 304 or (response.status_code == 200 and any(validators.values()) and validators == cached):
+            print("Update flag unchanged since the last pull. No action needed.")
+            return "Update flag unchanged since the last pull. No action needed."
         
+        if response.status_code == 404 and cached:
+            # flag removed, forget it so the next flag triggers a pull even if it looks the same.
+            # other errors (5xx, 401) say nothing about the flag and keep the cache
+            os.remove(UPDATE_FLAG_CACHE_FILE)
+
         if response.status_code == 200:
             print("Update flag found. Initiating git pull...")
             
@@ -139,13 +365,17 @@ def should_update():
                 check=True,
                 timeout=30
             )
+            save_update_flag_cache(validators)
             log_error(f"Git pull completed: {result.stdout.strip()}")
             print("Git pull successful.")
             print(f"Output:\n{result.stdout}")
             return f"Output:\n{result.stdout}" #True
-        else:
+        elif response.status_code == 404:
             print("No update flag found. No action needed.")
             return "No update flag found. No action needed." # False
+        else:
+            print(f"Update flag check failed: HTTP {response.status_code}")
+            return f"Update flag check failed: HTTP {response.status_code}" # False
             
     except subprocess.CalledProcessError as e:
         print(f"Error during git pull: {e}")
@@ -177,21 +407,24 @@ def get_system_uptime():
 def get_last_reading():
     """get the most recent weather reading"""
     try:
-        data = read_data_range(last_n_days=1)
-        if isinstance(data, list) and len(data) > 0:
-            return data[-1]
-        return None
+        return read_last_reading()
     except:
         return None 
 
 def get_last_error(window=7):
     """get the most recent error"""
     try:
-        errors = read_error_logs(last_n_days=window)
-        if isinstance(errors, list) and len(errors) > 0:
-            last_error = errors[-1]
-            return f"{last_error['timestep']}: {last_error['error_message']}"
-        return "No errors in last {window} days"
+        error_path = os.path.join(os.getcwd(), ERROR_LOG_FILE)
+        cutoff = (datetime.now() - timedelta(days=window)).strftime("%Y-%m-%d %H:%M:%S")
+        for line in iter_records_backwards(error_path):
+            parts = line.strip().split(',', 1)
+            # continuation lines of multi-line messages (git pull output) are not rows, keep walking back
+            if len(parts) == 2 and is_timestamp(parts[0]):
+                timestamp_str, error_message = parts
+                if timestamp_str >= cutoff:
+                    return f"{timestamp_str}: {error_message}"
+                break
+        return f"No errors in last {window} days"
     except Exception as e:
         return f"Error reading error log: {str(e)}"
 